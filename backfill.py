@@ -0,0 +1,125 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from config import (BACKFILL_START, BACKFILL_END, BACKFILL_MANIFEST, BATCH_WORKERS, BATCH_OUTPUT_DIR,
+                    RENDER_WORKERS, OFFLINE_MODE, TableJob)
+from data_loader import connect_to_mongodb, list_jobs, month_sequence
+from batch import run_batch
+
+def parse_month(text):
+    """แปลงข้อความ "YYYY-MM" เป็น (เดือน, ปี) (ValueError ถ้ารูปแบบไม่ถูกต้อง)"""
+    try:
+        value = datetime.strptime(text.strip(), "%Y-%m")
+    except ValueError:
+        raise ValueError(f"รูปแบบเดือนต้องเป็น YYYY-MM: {text}") from None
+    return value.month, value.year
+
+class BackfillManifest:
+    """บันทึกตารางที่สร้างเสร็จแล้วเป็น JSON หนึ่งบรรทัดต่อตาราง (เขียนต่อท้ายทันทีที่แต่ละตารางเสร็จ)
+
+    เมื่อเริ่มใหม่จะข้ามตารางที่เคยสร้างสำเร็จ ส่วนตารางที่ล้มเหลวจะถูกสร้างใหม่
+    บรรทัดสุดท้ายที่เขียนไม่ครบ (เช่น process ถูก kill) จะถูกข้าม
+    """
+
+    def __init__(self, path=BACKFILL_MANIFEST):
+        self.path = path
+        self.done = set()
+        self.lock = threading.Lock()
+        self.partial_line = False
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    self.partial_line = not line.endswith("\n")
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    job = TableJob(entry["department"], entry["table_type"], entry["month"], entry["year"])
+                    if entry.get("ok"):
+                        self.done.add(job)
+                    else:
+                        self.done.discard(job)
+
+    def is_done(self, job):
+        return TableJob(*job) in self.done
+
+    def record(self, job, ok):
+        """บันทึกผลของหนึ่งตาราง"""
+        entry = {
+            "department": job.department,
+            "table_type": job.table_type,
+            "month": job.month,
+            "year": job.year,
+            "ok": bool(ok),
+            "finished": datetime.now().isoformat(timespec="seconds"),
+        }
+        with self.lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                # ขึ้นบรรทัดใหม่ต่อจากบรรทัดที่เขียนไม่ครบ เพื่อไม่ให้บรรทัดนี้เสียไปด้วย
+                if self.partial_line:
+                    f.write("\n")
+                    self.partial_line = False
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            if ok:
+                self.done.add(job)
+
+def run_backfill(start=BACKFILL_START, end=BACKFILL_END, workers=BATCH_WORKERS, output_dir=BATCH_OUTPUT_DIR,
+                 render_workers=RENDER_WORKERS, manifest=None, collection=None, offline=OFFLINE_MODE):
+    """สร้างตารางย้อนหลังทุกแผนก/ประเภท ทีละเดือนตั้งแต่ start ถึง end (ข้อความ "YYYY-MM")
+
+    โหลดและสร้างครั้งละหนึ่งเดือน (ผ่าน run_batch) หน่วยความจำจึงไม่เพิ่มตามจำนวนปี
+    ตารางที่สร้างสำเร็จแล้วตาม manifest จะไม่ถูกโหลดหรือสร้างซ้ำ
+    คืนค่า dict สรุปจำนวนตาราง (done, failed, skipped) และเวลาที่ใช้
+    """
+    start = parse_month(start) if start else None
+    end = parse_month(end) if end else (datetime.now().month, datetime.now().year)
+    if start is None:
+        raise ValueError("ต้องระบุเดือนเริ่มต้น (BACKFILL_START หรือ --start)")
+    months = list(month_sequence(start, end))
+    manifest = manifest if manifest is not None else BackfillManifest()
+    if collection is None and not offline:
+        collection = connect_to_mongodb()
+
+    # หางานของทั้งช่วงด้วย query เดียว แล้วแยกตามเดือน
+    month_jobs = {}
+    for job in list_jobs(start, end, collection, offline=offline):
+        month_jobs.setdefault((job.month, job.year), []).append(job)
+
+    summary = {"done": 0, "failed": 0, "skipped": 0}
+    started = time.monotonic()
+
+    def on_result(job, ok):
+        manifest.record(job, ok)
+        summary["done" if ok else "failed"] += 1
+
+    print(f"สร้างตารางย้อนหลัง {len(months)} เดือน ({start[1]}-{start[0]:02d} ถึง {end[1]}-{end[0]:02d})")
+    for index, (month, year) in enumerate(months, start=1):
+        jobs = month_jobs.get((month, year), [])
+        remaining = [job for job in jobs if not manifest.is_done(job)]
+        summary["skipped"] += len(jobs) - len(remaining)
+
+        if remaining:
+            run_batch(remaining, workers=workers, output_dir=output_dir, render_workers=render_workers,
+                      collection=collection, on_result=on_result, offline=offline)
+
+        # ความคืบหน้า: จำนวนตารางต่อวินาทีนับเฉพาะตารางที่สร้างจริงในรอบนี้
+        elapsed = time.monotonic() - started
+        built = summary["done"] + summary["failed"]
+        rate = built / elapsed if elapsed > 0 else 0.0
+        eta = elapsed / index * (len(months) - index)
+        print(f"[{index}/{len(months)}] {year}-{month:02d}: {len(remaining)} ตาราง (ข้าม {len(jobs) - len(remaining)}) | "
+              f"สำเร็จ {summary['done']} ล้มเหลว {summary['failed']} | {rate:.2f} ตาราง/วินาที | "
+              f"เหลือประมาณ {eta / 60:.1f} นาที")
+
+    summary["seconds"] = time.monotonic() - started
+    print(f"สร้างตารางย้อนหลังเสร็จใน {summary['seconds']:.1f} วินาที: สำเร็จ {summary['done']} "
+          f"ล้มเหลว {summary['failed']} ข้าม {summary['skipped']} (manifest: {manifest.path})")
+    return summary
+
+if __name__ == "__main__":
+    run_backfill()
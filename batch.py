@@ -0,0 +1,124 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from config import BATCH_WORKERS, BATCH_OUTPUT_DIR, RENDER_WORKERS, IMAGE_BACKEND, OFFLINE_MODE
+from data_loader import load_batch_data
+from data_normalizer import normalize_schedule_data
+from table_processor import process_table_data
+from html_generator import generate_html_tiles
+from render_service import RenderService
+from render_cache import get_render_cache
+from instrumentation import PipelineMetrics
+
+def build_job_grid(job, df, metrics):
+    """normalize -> process ของหนึ่งตาราง (บันทึกเวลาลง metrics) คืนค่า ScheduleGrid"""
+    with metrics.stage("normalize") as info:
+        df = normalize_schedule_data(df)
+        info["rows_in"] = info["rows_out"] = len(df)
+    with metrics.stage("process") as info:
+        grid, column_keys = process_table_data(df, job)
+        info.update(rows_in=len(df), rows_out=grid.n_rows, columns=grid.n_columns + 2)
+    return grid
+
+def build_job_html(job, df, metrics=None):
+    """ประมวลผลหนึ่งตาราง: normalize -> process -> HTML
+
+    metrics ใช้ต่อจากขั้นตอนก่อนหน้าได้ (เช่น load ใน main) ไม่ระบุจะสร้าง PipelineMetrics ใหม่
+    คืนค่า (list ของ HTML แต่ละส่วนเมื่อแบ่งตาราง, PipelineMetrics ของขั้นตอนที่ทำแล้ว)
+    """
+    metrics = metrics if metrics is not None else PipelineMetrics(job)
+    with metrics.profile():
+        grid = build_job_grid(job, df, metrics)
+        with metrics.stage("html") as info:
+            html_parts = generate_html_tiles(grid, job)
+            if metrics.enabled:
+                info["html_bytes"] = sum(len(html_content.encode("utf-8")) for html_content in html_parts)
+                info["tiles"] = len(html_parts)
+    return html_parts, metrics
+
+def build_job_svg(job, df, output_dir=BATCH_OUTPUT_DIR, metrics=None):
+    """ประมวลผลหนึ่งตารางแล้ววาดเป็น SVG ใน process เดียวกัน (ไม่ต้องผ่าน RenderService)
+
+    คืนค่า (ผลลัพธ์ True/False, PipelineMetrics)
+    """
+    from svg_renderer import export_table_svg
+    metrics = metrics if metrics is not None else PipelineMetrics(job)
+    with metrics.profile():
+        grid = build_job_grid(job, df, metrics)
+        with metrics.stage("svg"):
+            ok = export_table_svg(grid, job, output_dir)
+    return ok, metrics
+
+def run_batch(jobs=None, month=None, year=None, workers=BATCH_WORKERS, output_dir=BATCH_OUTPUT_DIR,
+              render_workers=RENDER_WORKERS, collection=None, on_result=None, offline=OFFLINE_MODE):
+    """สร้างหลายตารางใน process เดียว
+
+    โหลดข้อมูลทุกงานด้วย connection และ query เดียว แล้วกระจายการสร้าง HTML
+    ไปยัง process pool และส่ง HTML ที่ได้ต่อให้ RenderService สร้างรูปภาพแบบขนาน
+    (เมื่อ IMAGE_BACKEND เป็น svg จะวาด SVG ใน process pool เลยโดยไม่ใช้ RenderService)
+    ถ้าไม่ระบุ jobs จะสร้างทุกแผนก/ประเภทของเดือนนั้น
+    on_result(job, ok) ถูกเรียกทันทีที่แต่ละตารางเสร็จ และ offline=True อ่านข้อมูลจาก snapshot อย่างเดียว
+    คืนค่าเป็น dict ของ TableJob -> ผลลัพธ์ (True/False)
+    """
+    frames = load_batch_data(jobs, month=month, year=year, collection=collection, offline=offline)
+    if not frames:
+        print("ไม่พบข้อมูลสำหรับสร้างตาราง")
+        return {}
+
+    print(f"กำลังสร้าง {len(frames)} ตาราง ด้วย {workers} process และ {render_workers} render worker")
+    results = {}
+    render_futures = {}
+    build = partial(build_job_svg, output_dir=output_dir) if IMAGE_BACKEND == "svg" else build_job_html
+    def finish(job, ok):
+        results[job] = ok
+        if on_result is not None:
+            on_result(job, ok)
+
+    def fail(job, error):
+        # ตารางที่ผิดพลาดถูกบันทึกว่าล้มเหลว ตารางอื่นยังสร้างต่อได้
+        print(f"เกิดข้อผิดพลาดในการสร้างตาราง {job.department} {job.table_type}: {error}")
+        finish(job, False)
+
+    with RenderService(workers=render_workers) as renderer:
+        def submit_render(job, output, metrics):
+            if IMAGE_BACKEND == "svg":
+                # วาด SVG เสร็จแล้วใน worker
+                finish(job, output)
+                metrics.emit()
+                return
+            # แต่ละส่วนของตารางที่ถูกแบ่ง render แบบขนานใน RenderService
+            render_futures[job] = (renderer.submit_tiles(output, job, output_dir, metrics), metrics)
+
+        if workers <= 1:
+            for job, df in frames.items():
+                try:
+                    submit_render(job, *build(job, df))
+                except Exception as e:
+                    fail(job, e)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(build, job, df): job
+                    for job, df in frames.items()
+                }
+                # ส่งงาน render ทันทีที่ HTML ของตารางนั้นเสร็จ
+                for future in as_completed(futures):
+                    job = futures[future]
+                    try:
+                        submit_render(job, *future.result())
+                    except Exception as e:
+                        fail(job, e)
+
+        for job, (futures, metrics) in render_futures.items():
+            finish(job, all([future.result() for future in futures]))
+            metrics.emit()
+
+    done = sum(1 for ok in results.values() if ok)
+    print(f"สร้างตารางสำเร็จ {done}/{len(results)} ตาราง")
+    cache = get_render_cache()
+    if cache is not None:
+        stats = cache.stats()
+        print(f"render cache: hit {stats['hits']} / miss {stats['misses']}")
+    return results
+
+if __name__ == "__main__":
+    run_batch()
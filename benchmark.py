@@ -0,0 +1,228 @@
+"""วัดเวลาและหน่วยความจำสูงสุดของแต่ละขั้นตอนด้วยข้อมูลสังเคราะห์
+
+ตัวอย่าง:
+    python benchmark.py --sizes small,medium --repeat 3
+    python benchmark.py --compare benchmark_results/20250101-120000.json
+    python benchmark.py --startup
+
+ขั้นตอน load ใช้ mongomock เป็น MongoDB จำลอง (ข้ามถ้าไม่ได้ติดตั้ง)
+ขั้นตอน export วัดเฉพาะการ render ด้วย wkhtmltoimage (ไม่ผ่าน cache และไม่เขียนไฟล์)
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+import pandas as pd
+from config import TableJob
+from synthetic_data import SIZES, generate_month
+import data_loader
+import snapshot_cache
+from data_normalizer import normalize_schedule_data
+from table_processor import process_table_data
+from html_generator import generate_html
+from image_exporter import render_image_bytes
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+BENCHMARK_DIR = os.getenv("BENCHMARK_DIR", "benchmark_results")
+
+# ชุดข้อมูลที่วัด: ตารางปกติ (ward + remark เป็น subward) และตารางที่ใช้ remark แทน ward
+SCENARIOS = {
+    "ward": dict(job=TableJob("Synthetic", "ตารางประจำเดือน", 1, 2025)),
+    "remark_as_ward": dict(job=TableJob("Synthetic", "Gastoenterology", 1, 2025), remark_as_ward=0.3),
+}
+
+def measure(func, repeat):
+    """วัดเวลา (ทำซ้ำ repeat ครั้ง) แล้ววัดหน่วยความจำสูงสุดอีกหนึ่งรอบด้วย tracemalloc
+
+    คืนค่า (ผลลัพธ์, สถิติ) โดยรอบที่วัดเวลาไม่เปิด tracemalloc เพื่อไม่ให้เวลาคลาดเคลื่อน
+    """
+    times = []
+    result = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = func()
+            times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, {
+        "median_s": statistics.median(times),
+        "min_s": min(times),
+        "peak_mb": peak / (1024 * 1024),
+    }
+
+def benchmark_case(documents, job, repeat=3, render=True):
+    """วัดแต่ละขั้นตอนของ pipeline สำหรับข้อมูลหนึ่งชุด"""
+    stages = {}
+
+    if mongomock is not None:
+        collection = mongomock.MongoClient()["company"]["doc"]
+        collection.insert_many([dict(doc) for doc in documents])
+        df, stages["load"] = measure(
+            lambda: data_loader.load_schedule_data(job, collection=collection, offline=False), repeat)
+    else:
+        print("ไม่พบ mongomock ข้ามการวัดขั้นตอน load")
+        df = data_loader.prepare_schedule_frame(
+            {field: [doc.get(field) for doc in documents] for field in data_loader.SCHEDULE_FIELDS})
+
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        snapshots = snapshot_cache.SnapshotCache(snapshot_dir)
+        snapshots.put(job, df)
+        _, stages["snapshot"] = measure(lambda: snapshots.get(job), repeat)
+
+    normalized, stages["normalize"] = measure(lambda: normalize_schedule_data(df), repeat)
+    (grid, _), stages["process"] = measure(lambda: process_table_data(normalized, job), repeat)
+    html_content, stages["html"] = measure(lambda: generate_html(grid, job), repeat)
+
+    if render:
+        try:
+            _, stages["export"] = measure(lambda: render_image_bytes(html_content), repeat)
+        except (OSError, ValueError) as e:
+            # ไม่มี wkhtmltoimage ในเครื่อง
+            print(f"ข้ามการวัดขั้นตอน export: {str(e).strip().splitlines()[0]}")
+
+    return {
+        "rows": len(documents),
+        "columns": grid.n_columns + 2,
+        "html_kb": len(html_content.encode("utf-8")) / 1024,
+        "stages": stages,
+    }
+
+def run_benchmarks(sizes=("small", "medium"), scenarios=None, repeat=3, render=True, seed=0):
+    """วัดทุกขนาดและทุกชุดข้อมูล คืนค่าผลลัพธ์เป็น dict ที่บันทึกเป็น JSON ได้"""
+    scenarios = scenarios or list(SCENARIOS)
+    # วัดการโหลดจาก MongoDB จริงทุกครั้ง ไม่อ่านจาก snapshot
+    snapshot_cache.SNAPSHOT_ENABLED = False
+
+    results = {}
+    for size in sizes:
+        for scenario in scenarios:
+            options = SCENARIOS[scenario]
+            documents = generate_month(size, seed=seed, **options)
+            name = f"{size}/{scenario}"
+            print(f"กำลังวัด {name} ({len(documents)} แถว)")
+            results[name] = benchmark_case(documents, options["job"], repeat=repeat, render=render)
+            for stage, stats in results[name]["stages"].items():
+                print(f"  {stage:<10} {stats['median_s'] * 1000:10.1f} ms  peak {stats['peak_mb']:8.1f} MB")
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "repeat": repeat,
+        "seed": seed,
+        "results": results,
+    }
+
+# คำสั่งที่วัดเวลาเริ่มโปรแกรม (process ใหม่ทุกครั้ง): CLI และการ import โมดูลที่แต่ละคำสั่งต้องใช้
+STARTUP_COMMANDS = {
+    "python": ["-c", "pass"],
+    "cli --help": ["main.py", "--help"],
+    "import config": ["-c", "import config"],
+    "import image_exporter": ["-c", "import image_exporter"],
+    "import html_generator": ["-c", "import html_generator"],
+    "import data_loader": ["-c", "import data_loader"],
+    "import table_processor": ["-c", "import table_processor"],
+    "import server": ["-c", "import server"],
+}
+
+def startup_benchmark(repeat=5):
+    """วัดเวลาเริ่ม process ของแต่ละคำสั่ง (ms) เพื่อดูผลของการ import ที่หนัก"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for name, args in STARTUP_COMMANDS.items():
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, *args], cwd=directory, stdout=subprocess.DEVNULL, check=True)
+            times.append(time.perf_counter() - start)
+        results[name] = {"median_s": statistics.median(times), "min_s": min(times)}
+        print(f"  {name:<24} {results[name]['median_s'] * 1000:8.1f} ms")
+    return results
+
+def save_results(report, output_dir=BENCHMARK_DIR):
+    """บันทึกผลเป็นไฟล์ JSON ตามเวลาที่วัด คืนค่า path ของไฟล์"""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{report['timestamp'].replace(':', '').replace('T', '-')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return path
+
+def compare_results(report, baseline):
+    """พิมพ์อัตราส่วนเวลาและหน่วยความจำเทียบกับผลครั้งก่อน (>1 คือช้าลง/ใช้มากขึ้น)"""
+    for name, stats in report.get("startup", {}).items():
+        base_stats = baseline.get("startup", {}).get(name)
+        if base_stats:
+            print(f"startup {name:<24} time x{stats['median_s'] / base_stats['median_s']:5.2f}")
+
+    for name, case in report["results"].items():
+        base_case = baseline["results"].get(name)
+        if base_case is None:
+            continue
+        print(name)
+        for stage, stats in case["stages"].items():
+            base_stats = base_case["stages"].get(stage)
+            if not base_stats or not base_stats["median_s"]:
+                continue
+            time_ratio = stats["median_s"] / base_stats["median_s"]
+            memory_ratio = stats["peak_mb"] / base_stats["peak_mb"] if base_stats["peak_mb"] else float("nan")
+            flag = "  <-- ช้าลง" if time_ratio > 1.2 else ""
+            print(f"  {stage:<10} time x{time_ratio:5.2f}  memory x{memory_ratio:5.2f}{flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description="วัดประสิทธิภาพแต่ละขั้นตอนด้วยข้อมูลสังเคราะห์")
+    parser.add_argument("--sizes", default="small,medium", help=f"ขนาดข้อมูล คั่นด้วย , ({', '.join(SIZES)})")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="ชุดข้อมูล คั่นด้วย ,")
+    parser.add_argument("--repeat", type=int, default=3, help="จำนวนครั้งที่วัดเวลาต่อขั้นตอน")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-render", action="store_true", help="ไม่วัดขั้นตอน export")
+    parser.add_argument("--output", default=BENCHMARK_DIR, help="โฟลเดอร์สำหรับบันทึกผล")
+    parser.add_argument("--compare", help="ไฟล์ผลครั้งก่อนที่ต้องการเทียบ")
+    parser.add_argument("--startup", action="store_true", help="วัดเวลาเริ่มโปรแกรมแทนการวัด pipeline")
+    args = parser.parse_args()
+
+    if args.startup:
+        print("เวลาเริ่มโปรแกรม")
+        report = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "repeat": args.repeat,
+            "startup": startup_benchmark(args.repeat),
+            "results": {},
+        }
+    else:
+        report = run_benchmarks(
+            sizes=args.sizes.split(","),
+            scenarios=args.scenarios.split(","),
+            repeat=args.repeat,
+            render=not args.no_render,
+            seed=args.seed,
+        )
+    print(f"บันทึกผลที่ {save_results(report, args.output)}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare_results(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
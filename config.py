@@ -1,20 +1,129 @@
 import os
-from dotenv import load_dotenv
+import json
+from collections import namedtuple
 
-# โหลด .env
-load_dotenv()
+def find_env_file():
+    """หาไฟล์ .env จากโฟลเดอร์ของ config.py ขึ้นไป (แบบเดียวกับ dotenv.find_dotenv)"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+# โหลด .env (import python-dotenv เฉพาะเมื่อมีไฟล์ เพื่อให้เริ่มโปรแกรมได้เร็ว)
+env_file = find_env_file()
+if env_file:
+    from dotenv import load_dotenv
+    load_dotenv(env_file)
 
 # ตั้งค่าข้อมูลเชื่อมต่อ MongoDB
 MONGO_URI = os.getenv("MONGO_URI")
 
-# ตั้งค่าเดือนและปี
-month_filter = 12
-year_filter = 2024
-department_filter = "วิสัญญี"  # อายุรกรรม วิสัญญี กุมารเวช
-table_type = "ตารางประจำเดือน"  # สามารถเปลี่ยนเป็น Transplant ตารางประจำเดือน คลินิคนอกเวลา / Gastoenterology ตารางเวร R1 Resident Neurology
+# เปิดใช้งานการสร้าง index (department, type, datetime) อัตโนมัติ และการตรวจ query plan ด้วย explain
+MONGO_ENSURE_INDEX = os.getenv("MONGO_ENSURE_INDEX", "0") == "1"
+MONGO_EXPLAIN_QUERY = os.getenv("MONGO_EXPLAIN_QUERY", "0") == "1"
+
+# จำนวนเอกสารต่อ batch ที่ดึงจาก cursor
+MONGO_BATCH_SIZE = int(os.getenv("MONGO_BATCH_SIZE", "2000"))
+
+# รวมข้อมูลเป็นเซลล์ของตาราง (วัน x คอลัมน์ -> รายชื่อ) บน MongoDB ด้วย aggregation pipeline
+# แทนการดึงทุกเอกสารมารวมใน Python (ผลลัพธ์ตารางเหมือนเดิม)
+MONGO_AGGREGATE = os.getenv("MONGO_AGGREGATE", "0") == "1"
+
+# ตั้งค่าเดือนและปี (กำหนดผ่าน env หรือ argument ของ main.py ได้)
+month_filter = int(os.getenv("TABLE_MONTH", "12"))
+year_filter = int(os.getenv("TABLE_YEAR", "2024"))
+department_filter = os.getenv("TABLE_DEPARTMENT", "วิสัญญี")  # อายุรกรรม วิสัญญี กุมารเวช
+table_type = os.getenv("TABLE_TYPE", "ตารางประจำเดือน")  # สามารถเปลี่ยนเป็น Transplant ตารางประจำเดือน คลินิคนอกเวลา / Gastoenterology ตารางเวร R1 Resident Neurology
+
+# งานหนึ่งตาราง = (แผนก, ประเภทตาราง, เดือน, ปี)
+TableJob = namedtuple("TableJob", ["department", "table_type", "month", "year"])
+
+def default_job():
+    """คืนค่างานตามค่าตั้งต้นด้านบน"""
+    return TableJob(department_filter, table_type, month_filter, year_filter)
+
+# ตั้งค่าโหมด batch (จำนวน process ที่ใช้ประมวลผลพร้อมกัน และโฟลเดอร์ผลลัพธ์)
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", os.cpu_count() or 1))
+BATCH_OUTPUT_DIR = os.getenv("BATCH_OUTPUT_DIR", "output")
+
+# สร้างตารางย้อนหลัง (backfill.py) ตั้งแต่ BACKFILL_START ถึง BACKFILL_END (รูปแบบ YYYY-MM, ไม่ระบุ END = เดือนปัจจุบัน)
+# BACKFILL_MANIFEST: ไฟล์บันทึกตารางที่สร้างเสร็จแล้ว ใช้ทำต่อจากเดิมเมื่อถูกหยุดกลางคัน
+BACKFILL_START = os.getenv("BACKFILL_START", "")
+BACKFILL_END = os.getenv("BACKFILL_END", "")
+BACKFILL_MANIFEST = os.getenv("BACKFILL_MANIFEST", "backfill_manifest.jsonl")
+
+# โฟลเดอร์สำหรับไฟล์ HTML/PNG ที่ส่งออก (ค่าตั้งต้นคือโฟลเดอร์ปัจจุบัน)
+OUTPUT_DIR = os.getenv("OUTPUT_DIR", ".")
+
+# ตัวสร้างตาราง HTML: "jinja" (template ที่ compile ไว้) หรือ "styler" (pandas Styler แบบเดิม)
+HTML_RENDERER = os.getenv("HTML_RENDERER", "jinja")
+
+# วิธีสร้างรูปภาพ: "wkhtmltoimage" (HTML -> PNG) หรือ "svg" (วาดตารางเป็น SVG ด้วย Python ไม่ต้องใช้ wkhtmltoimage)
+# SVG_FORMATS: ไฟล์ที่สร้างเมื่อใช้ svg คั่นด้วย , (png/pdf ต้องติดตั้ง cairosvg)
+# FONT_PATH: ไฟล์ฟอนต์ที่รองรับภาษาไทย ใช้วัดความกว้างข้อความใน SVG และฝังใน HTML/SVG (ต้องติดตั้ง fontTools)
+# FONT_EMBED: ฝังฟอนต์ (เฉพาะตัวอักษรที่ใช้) เป็น base64 แทนการโหลดจาก Google Fonts
+IMAGE_BACKEND = os.getenv("IMAGE_BACKEND", "wkhtmltoimage")
+SVG_FORMATS = [fmt.strip() for fmt in os.getenv("SVG_FORMATS", "svg").split(",") if fmt.strip()]
+FONT_PATH = os.getenv("FONT_PATH", os.path.join("fonts", "Prompt-Regular.ttf"))
+FONT_FAMILY = os.getenv("FONT_FAMILY", "Prompt")
+FONT_EMBED = os.getenv("FONT_EMBED", "1") == "1"
+# แหล่งดาวน์โหลดฟอนต์ลง FONT_PATH ด้วย python font_embed.py (เครื่องที่ render ไม่ต้องต่อ network)
+FONT_URL = os.getenv("FONT_URL", "https://github.com/google/fonts/raw/main/ofl/prompt/Prompt-Regular.ttf")
+
+# แบ่งตารางที่กว้างเกินไปเป็นหลายรูป (ทุกรูปมีคอลัมน์ Day/Date)
+# TILE_MODE: "" = ไม่แบ่ง, "role" = แบ่งตาม role, "columns" = แบ่งทุก TILE_MAX_COLUMNS คอลัมน์
+# แบ่งเมื่อคอลัมน์เนื้อหามากกว่า TILE_MAX_COLUMNS (โหมด role จะแบ่ง role ที่ยังกว้างเกินซ้ำอีกครั้ง)
+TILE_MODE = os.getenv("TILE_MODE", "")
+TILE_MAX_COLUMNS = int(os.getenv("TILE_MAX_COLUMNS", "12"))
+
+# ตั้งค่าการ render รูปภาพ (จำนวน worker, เวลาสูงสุดต่องานเป็นวินาที, จำนวนครั้งที่ลองใหม่)
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", os.cpu_count() or 1))
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", "120"))
+RENDER_RETRIES = int(os.getenv("RENDER_RETRIES", "1"))
+
+# cache รูปภาพตาม hash ของ HTML + ค่าการ render (ข้ามการ render เมื่อ HTML ไม่เปลี่ยน)
+RENDER_CACHE_ENABLED = os.getenv("RENDER_CACHE_ENABLED", "1") == "1"
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", ".render_cache")
+RENDER_CACHE_MAX_MB = float(os.getenv("RENDER_CACHE_MAX_MB", "512"))
+RENDER_CACHE_MAX_AGE_DAYS = float(os.getenv("RENDER_CACHE_MAX_AGE_DAYS", "30"))
+
+# snapshot ข้อมูลตารางแบบ Parquet ต่อ (แผนก, ประเภท, เดือน, ปี)
+# snapshot ที่บันทึกหลังเดือนปิดแล้วใช้ได้ตลอด ส่วนที่บันทึกก่อนเดือนปิด (รวมเดือนปัจจุบัน) ใช้ได้ภายใน SNAPSHOT_TTL วินาที
+# OFFLINE_MODE=1 อ่านจาก snapshot อย่างเดียว ไม่เชื่อมต่อ MongoDB
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "1") == "1"
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", ".snapshots")
+SNAPSHOT_TTL = float(os.getenv("SNAPSHOT_TTL", "600"))
+OFFLINE_MODE = os.getenv("OFFLINE_MODE", "0") == "1"
+
+# วัดเวลาและข้อมูลของแต่ละขั้นตอน บันทึกเป็น JSON หนึ่งบรรทัดต่อตารางใน METRICS_FILE ("-" = พิมพ์ออกหน้าจอ)
+# PROFILE_MODE เปิด profiling เพิ่ม: "cprofile", "tracemalloc" หรือ "cprofile,tracemalloc" (ไฟล์ .prof เก็บใน PROFILE_DIR)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+METRICS_FILE = os.getenv("METRICS_FILE", "metrics.jsonl")
+PROFILE_MODE = {mode.strip() for mode in os.getenv("PROFILE_MODE", "").split(",") if mode.strip()}
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# HTTP service สำหรับสร้างตารางตามคำขอ (server.py)
+# SERVER_CACHE_SIZE: จำนวนผลลัพธ์ที่เก็บในหน่วยความจำ, SERVER_CACHE_TTL: อายุ (วินาที) ของตารางเดือนปัจจุบัน
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+SERVER_CACHE_SIZE = int(os.getenv("SERVER_CACHE_SIZE", "64"))
+SERVER_CACHE_TTL = float(os.getenv("SERVER_CACHE_TTL", "60"))
+
+# โหมดเฝ้าดูการเปลี่ยนแปลง (watch mode)
+# WATCH_DEBOUNCE: รอให้ไม่มีการแก้ไขเพิ่มกี่วินาทีก่อนสร้างตารางใหม่, WATCH_MAX_DELAY: รอนานสุดกี่วินาที
+# WATCH_POLL_FIELD: ฟิลด์ที่ใช้เป็น watermark เมื่อใช้ change stream ไม่ได้ (ถ้าไม่มีในข้อมูลจะใช้ _id)
+WATCH_DEBOUNCE = float(os.getenv("WATCH_DEBOUNCE", "5"))
+WATCH_MAX_DELAY = float(os.getenv("WATCH_MAX_DELAY", "60"))
+WATCH_POLL_INTERVAL = float(os.getenv("WATCH_POLL_INTERVAL", "10"))
+WATCH_POLL_FIELD = os.getenv("WATCH_POLL_FIELD", "updated")
 
 # ตั้งค่า path สำหรับ wkhtmltoimage
-WKHTMLTOIMAGE_PATH = r"C:\Program Files\wkhtmltopdf\bin\wkhtmltoimage.exe"
+WKHTMLTOIMAGE_PATH = os.getenv("WKHTMLTOIMAGE_PATH", r"C:\Program Files\wkhtmltopdf\bin\wkhtmltoimage.exe")
 
 # ชื่อเดือนภาษาไทย
 month_names = {
@@ -26,4 +135,46 @@ month_names = {
 # ตั้งค่าหัวข้อตามประเภทตาราง
 title_mapping = {
     "คลินิคนอกเวลา": "ผู้ป่วยนอก",
-}
\ No newline at end of file
+}
+
+# กฎการเรียงลำดับคอลัมน์ (ค่าน้อยมาก่อน ค่าที่ไม่อยู่ในตารางจะได้ 999)
+# ward ใช้การจับคู่แบบ substring โดยเลือก key แรกตามลำดับในตาราง
+COLUMN_ORDER_RULES = {
+    "role": {
+        "R1": 1, "R2": 2, "R3": 3, "Fellow": 4, "Staff": 5,
+        "Stroke": 1, "Non Stroke": 2,
+    },
+    "period_w": {
+        "เช้า": 1, "กลางวัน": 2, "เย็น": 3, "ดึก": 4
+    },
+    "subward": {
+        "Chief": 1, "SICU": 2, "CVT ICU": 3,
+        "Stroke": 1, "Non Stroke": 2,
+    },
+    "ward": {
+        "CVT": 1,"CRITICAL CARE": 2,"PAIN": 3,"PED": 4,
+        "เวร Day": 1,"เวรทั้งวัน": 2,
+        "19 B-2": 1,"19 B-1": 2,"25 C-128 C": 3,"26 A27 C":4,"26 B27 C":5,
+        "วังบน": 1,"วังล่าง": 2,"ICU 1": 3,"ICU1": 3,"ICU 2":4,"ICU2":4,"CCU":5,"ER":6,"COVID":7,"COVID 2 (จก4)":8,"OPD 9 บ่าย":9,"OPD 9 เช้าวันหยุด":10,
+        #Cardiology
+        "F1": 1,"F2": 2,"F3 MRI / ECHO": 3,"F3 EP":4,"F3 HF":5,"F3 Cath":6,
+        #Nephrology
+        "1st call": 1,"Standby": 2,"F3":3,
+        "Stroke": 1,"Epliepsy": 12,
+        "Neuroimmuno": 13,"Neurocognitive": 14,"Neuromuscular":15,
+        #กุมาร R1
+        "ภส.20C, 19C1-C2 18C 21C, 28B":1,"สก.15G1 ,G2 สก. 6":2,"Nursery":7,"OPD No.9":8,
+        #กุมาร R2
+        "สก/ภส.":1,"OPD9":6,
+        #กุมาร R3
+        "สก/ภูมิสิริ":1,"PICU":3,"NICU":4,"CRC":5,
+    },
+}
+
+# เพิ่ม/แก้กฎการเรียงลำดับจากไฟล์ JSON ได้โดยไม่ต้องแก้โค้ด
+# รูปแบบเดียวกับ COLUMN_ORDER_RULES เช่น {"ward": {"ICU 3": 5}}
+COLUMN_ORDER_FILE = os.getenv("COLUMN_ORDER_FILE")
+if COLUMN_ORDER_FILE:
+    with open(COLUMN_ORDER_FILE, encoding="utf-8") as f:
+        for section, rules in json.load(f).items():
+            COLUMN_ORDER_RULES.setdefault(section, {}).update(rules)
@@ -1,41 +1,361 @@
-from pymongo import MongoClient
+import threading
+from datetime import datetime
+from pymongo import MongoClient, ASCENDING
+import numpy as np
 import pandas as pd
-from config import MONGO_URI, month_filter, year_filter, department_filter, table_type, month_names
+from config import (MONGO_URI, MONGO_ENSURE_INDEX, MONGO_EXPLAIN_QUERY, MONGO_BATCH_SIZE, MONGO_AGGREGATE,
+                    OFFLINE_MODE, month_names, TableJob, default_job)
+from snapshot_cache import get_snapshot_cache
+from data_normalizer import ROW_COUNT_FIELD
+
+# index สำหรับ query ตาราง (แผนก, ประเภท, ช่วงวันที่)
+SCHEDULE_INDEX_NAME = "department_type_datetime"
+SCHEDULE_INDEX_KEYS = [("department", ASCENDING), ("type", ASCENDING), ("datetime", ASCENDING)]
+
+# ฟิลด์ที่ pipeline ใช้งานจริง (ไม่ดึง _id และฟิลด์อื่นๆ มาด้วย)
+SCHEDULE_FIELDS = ["datetime", "role", "name", "ward", "remark", "subward", "period_w", "period_h"]
+BATCH_FIELDS = SCHEDULE_FIELDS + ["department", "type"]
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_mongo_client():
+    """คืนค่า MongoClient ที่ใช้ร่วมกันทั้ง process (MongoClient มี connection pool และใช้ข้าม thread ได้)"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = MongoClient(MONGO_URI)
+    return _client
 
 def connect_to_mongodb():
     """เชื่อมต่อกับ MongoDB"""
-    client = MongoClient(MONGO_URI)
+    client = get_mongo_client()
     db = client["company"]
     collection = db["doc"]
     return collection
 
-def load_schedule_data():
-    """โหลดข้อมูลตารางจาก MongoDB"""
-    collection = connect_to_mongodb()
-    
+def month_range(month, year):
+    """สร้างช่วงวันที่แบบ [วันแรกของเดือน, วันแรกของเดือนถัดไป) เพื่อให้ใช้ index ได้"""
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return {"$gte": start, "$lt": end}
+
+def month_sequence(start, end):
+    """ไล่ (เดือน, ปี) ตั้งแต่ start ถึง end (รวมทั้งสองเดือน)"""
+    month, year = start
+    while (year, month) <= (end[1], end[0]):
+        yield month, year
+        month, year = (1, year + 1) if month == 12 else (month + 1, year)
+
+def schedule_query(job):
+    """สร้าง query สำหรับหนึ่งตาราง"""
+    return {
+        "department": job.department,
+        "type": job.table_type,
+        "datetime": month_range(job.month, job.year)
+    }
+
+def ensure_schedule_index(collection=None):
+    """สร้าง (ถ้ายังไม่มี) และตรวจสอบ compound index (department, type, datetime)"""
+    if collection is None:
+        collection = connect_to_mongodb()
+
+    collection.create_index(SCHEDULE_INDEX_KEYS, name=SCHEDULE_INDEX_NAME)
+
+    # ตรวจสอบว่ามี index ที่มี key ตรงกันจริง
+    for name, info in collection.index_information().items():
+        if [(field, direction) for field, direction in info["key"]] == SCHEDULE_INDEX_KEYS:
+            return name
+
+    print(f"Warning: ไม่พบ index {SCHEDULE_INDEX_NAME} หลังจากสร้างแล้ว")
+    return None
+
+def find_plan_stages(plan):
+    """ดึงชื่อ stage ทั้งหมดจาก query plan (รวม stage ย่อย)"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for key in ("inputStage", "queryPlan"):
+            stages.extend(find_plan_stages(plan.get(key)))
+        for child in plan.get("inputStages", []):
+            stages.extend(find_plan_stages(child))
+    return stages
+
+def check_query_plan(query, collection=None):
+    """ใช้ explain ตรวจสอบว่า query ใช้ index หรือไม่ และเตือนเมื่อเป็น COLLSCAN"""
+    if collection is None:
+        collection = connect_to_mongodb()
+
+    explain = collection.find(query).explain()
+    winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+    stages = find_plan_stages(winning_plan)
+
+    if "COLLSCAN" in stages:
+        print(f"Warning: query ทำ COLLSCAN บน {collection.full_name} ควรสร้าง index ด้วย ensure_schedule_index()")
+    return stages
+
+def read_columns(collection, query, fields, batch_size=MONGO_BATCH_SIZE):
+    """อ่าน cursor ทีละ batch ลงใน list แยกตามคอลัมน์ โดยดึงเฉพาะฟิลด์ที่ระบุ
+
+    เรียงตาม (datetime, _id) เพื่อให้ลำดับชื่อในเซลล์ไม่ขึ้นกับ query plan (และตรงกับ schedule_pipeline)
+    """
+    projection = {field: 1 for field in fields}
+    projection["_id"] = 0
+    cursor = collection.find(query, projection).sort([("datetime", 1), ("_id", 1)]).batch_size(batch_size)
+
+    columns = {field: [] for field in fields}
+    for doc in cursor:
+        for field, values in columns.items():
+            values.append(doc.get(field, np.nan))
+    return drop_missing_columns(columns)
+
+def drop_missing_columns(columns):
+    """ตัดคอลัมน์ที่ไม่มีในเอกสารใดเลยออก เพื่อให้ตรวจสอบ "ward" in df.columns ได้เหมือนเดิม"""
+    return {
+        field: values for field, values in columns.items()
+        if any(value is not np.nan for value in values)
+    }
+
+def drop_missing_fields(df):
+    """ตัดคอลัมน์ใน SCHEDULE_FIELDS ที่ไม่มีค่าในแถวใดเลยของตารางนี้ (แบบเดียวกับ drop_missing_columns)
+
+    ใช้กับแต่ละตารางที่แยกจากผลของ batch เพราะคอลัมน์ที่มีเฉพาะในตารางอื่นจะเป็น NaN ทั้งคอลัมน์
+    """
+    missing = [
+        field for field in SCHEDULE_FIELDS
+        if field in df.columns and df[field].isna().all() and not any(value is None for value in df[field])
+    ]
+    return df.drop(columns=missing) if missing else df
+
+def schedule_pipeline(query, fields):
+    """สร้าง aggregation pipeline ที่รวมเอกสารเป็นเซลล์ของตารางบน MongoDB
+
+    รวมตาม (วัน, role, period_w, period_h, ward, remark, subward, ...) แล้วคืนหนึ่งเอกสารต่อเซลล์
+    ใน names มีชื่อ (n), เวลา (t) และ _id (i) ของเอกสารแรกที่พบ (ใช้เรียงลำดับให้เหมือนการอ่านแบบเดิม)
+    และจำนวนเอกสาร (c) ของแต่ละชื่อ ฟิลด์ที่ไม่มีในเอกสารจะไม่มีใน _id เช่นเดียวกับผลจาก find
+    """
+    key_fields = [field for field in fields if field not in ("datetime", "name")]
+    day = {"$dateToString": {"format": "%Y-%m-%d", "date": "$datetime"}}
+    return [
+        {"$match": query},
+        # เรียงแบบเดียวกับการอ่านผ่าน index (department, type, datetime) เพื่อให้ $first เป็นเอกสารแรกที่พบ
+        {"$sort": {"datetime": 1, "_id": 1}},
+        {"$group": {
+            "_id": {"day": day, **{field: f"${field}" for field in key_fields}, "name": "$name"},
+            "datetime": {"$first": "$datetime"},
+            "first_id": {"$first": "$_id"},
+            "rows": {"$sum": 1},
+        }},
+        {"$group": {
+            "_id": {"day": "$_id.day", **{field: f"$_id.{field}" for field in key_fields}},
+            "names": {"$push": {
+                "n": {"$ifNull": ["$_id.name", None]},
+                "t": "$datetime",
+                "i": "$first_id",
+                "c": "$rows",
+            }},
+        }},
+    ]
+
+def cell_columns(cells, fields):
+    """แปลงเซลล์จาก schedule_pipeline เป็นข้อมูลแบบคอลัมน์ หนึ่งแถวต่อ (เซลล์, ชื่อ) ตามลำดับที่พบครั้งแรก
+
+    ไม่ขยายกลับเป็นหนึ่งแถวต่อเอกสาร จำนวนเอกสารของแต่ละแถวอยู่ในคอลัมน์ ROW_COUNT_FIELD
+    (table_processor ใช้นับแถวที่หา column ไม่เจอ) datetime เป็นเวลาของเอกสารแรกที่พบ
+    """
+    keys, cell_index, names, times, ids, counts = [], [], [], [], [], []
+    for cell in cells:
+        for entry in cell["names"]:
+            cell_index.append(len(keys))
+            names.append(entry["n"])
+            times.append(entry["t"])
+            # ObjectId เรียงตาม bytes ได้เหมือนกัน แต่เปรียบเทียบเร็วกว่ามาก
+            ids.append(getattr(entry["i"], "binary", entry["i"]))
+            counts.append(entry["c"])
+        keys.append(cell["_id"])
+
+    # เรียงตาม (เวลา, _id) ของเอกสารแรกที่พบ เหมือนลำดับของ read_columns
+    id_rank = np.empty(len(ids), dtype=np.int64)
+    id_rank[sorted(range(len(ids)), key=ids.__getitem__)] = np.arange(len(ids))
+    order = np.lexsort((id_rank, pd.to_datetime(pd.Series(times, dtype=object)).to_numpy()))
+    rows = np.asarray(cell_index, dtype=np.int64)[order]
+
+    columns = {}
+    for field in fields:
+        if field == "datetime":
+            values = np.array(times, dtype=object)[order]
+        elif field == "name":
+            values = np.array(names, dtype=object)[order]
+        else:
+            values = np.array([key.get(field, np.nan) for key in keys], dtype=object)[rows]
+        columns[field] = values.tolist()
+    columns[ROW_COUNT_FIELD] = np.asarray(counts, dtype=np.int64)[order].tolist()
+    return columns
+
+def aggregate_columns(collection, query, fields, batch_size=MONGO_BATCH_SIZE):
+    """รวมข้อมูลเป็นเซลล์ด้วย aggregation pipeline แล้วแยกตามคอลัมน์แบบเดียวกับ read_columns (หนึ่งแถวต่อชื่อในเซลล์)"""
+    cursor = collection.aggregate(schedule_pipeline(query, fields), allowDiskUse=True, batchSize=batch_size)
+    return drop_missing_columns(cell_columns(cursor, fields))
+
+def fetch_columns(collection, query, fields):
+    """ดึงข้อมูลด้วย find หรือ aggregation pipeline ตาม MONGO_AGGREGATE"""
+    if MONGO_AGGREGATE:
+        return aggregate_columns(collection, query, fields)
+    return read_columns(collection, query, fields)
+
+def prepare_schedule_frame(columns):
+    """แปลงข้อมูลแบบคอลัมน์จาก MongoDB เป็น DataFrame
+
+    คอลัมน์วันที่ (day, date_num, date_key) สร้างใน data_normalizer.normalize_schedule_data
+    """
+    df = pd.DataFrame(columns)
+    if df.empty:
+        return df
+
+    df["datetime"] = pd.to_datetime(df["datetime"])
+    return df
+
+def load_schedule_data(job=None, collection=None, offline=OFFLINE_MODE):
+    """โหลดข้อมูลตารางจาก snapshot ถ้ายังใช้ได้ ไม่เช่นนั้นโหลดจาก MongoDB แล้วบันทึก snapshot
+
+    offline=True อ่านจาก snapshot อย่างเดียว ไม่เชื่อมต่อ MongoDB
+    """
+    job = job or default_job()
+    snapshots = get_snapshot_cache(offline)
+    if snapshots is not None:
+        df = snapshots.get(job, allow_stale=offline)
+        if df is not None:
+            return df
+
+    month_name = month_names.get(job.month, f"เดือน {job.month}")
+    if offline:
+        print(f"ไม่พบ snapshot สำหรับประเภท {job.table_type} ในเดือน {month_name} {job.year} (offline mode)")
+        return None
+
+    if collection is None:
+        collection = connect_to_mongodb()
+
+    if MONGO_ENSURE_INDEX:
+        ensure_schedule_index(collection)
+
     # ดึงข้อมูลและแปลงเป็น DataFrame - เพิ่ม filter ตาม type
-    data = list(collection.find({
-        "datetime": {"$exists": True, "$ne": None},
-        "department": department_filter,
-        "type": table_type,
-        "$expr": {
-            "$and": [
-                {"$eq": [{"$month": "$datetime"}, month_filter]},
-                {"$eq": [{"$year": "$datetime"}, year_filter]}
-            ]
-        }
-    }))
-    
-    df = pd.DataFrame(data)
+    query = schedule_query(job)
+    if MONGO_EXPLAIN_QUERY:
+        check_query_plan(query, collection)
+    df = prepare_schedule_frame(fetch_columns(collection, query, SCHEDULE_FIELDS))
     if df.empty:
-        month_name = month_names.get(month_filter, f"เดือน {month_filter}")
-        print(f"ไม่พบข้อมูลสำหรับประเภท {table_type} ในเดือน {month_name} {year_filter}")
+        print(f"ไม่พบข้อมูลสำหรับประเภท {job.table_type} ในเดือน {month_name} {job.year}")
         return None
-    
-    # แปลง datetime เป็นวันที่ + ชื่อวัน
-    df["datetime"] = pd.to_datetime(df["datetime"])
-    df["day"] = df["datetime"].dt.strftime('%a')
-    df["date_num"] = df["datetime"].dt.day
-    df["date_key"] = df["datetime"].dt.strftime('%Y-%m-%d')
-    
-    return df
\ No newline at end of file
+
+    if snapshots is not None:
+        snapshots.put(job, df)
+    return df
+
+def load_batch_data(jobs=None, month=None, year=None, collection=None, offline=OFFLINE_MODE):
+    """โหลดข้อมูลหลายตารางด้วย query เดียว แล้วแยกตามงานในหน่วยความจำ
+
+    ถ้าไม่ระบุ jobs จะสร้างงานจากทุกแผนก/ประเภทที่พบในเดือน month ปี year
+    งานที่มี snapshot ที่ยังใช้ได้จะอ่านจาก snapshot และ query เฉพาะงานที่เหลือ
+    offline=True อ่านจาก snapshot อย่างเดียว
+    คืนค่าเป็น dict ของ TableJob -> DataFrame
+    """
+    snapshots = get_snapshot_cache(offline)
+    defaults = default_job()
+    if jobs:
+        jobs = [TableJob(*job) for job in jobs]
+    elif offline and snapshots is not None:
+        jobs = snapshots.jobs(month or defaults.month, year or defaults.year)
+        if not jobs:
+            return {}
+
+    frames = {}
+    if jobs and snapshots is not None:
+        for job in jobs:
+            df = snapshots.get(job, allow_stale=offline)
+            if df is not None:
+                frames[job] = df
+
+    remaining = [job for job in jobs if job not in frames] if jobs else None
+    if offline or (jobs and not remaining):
+        return finish_batch_frames(jobs, frames)
+
+    if collection is None:
+        collection = connect_to_mongodb()
+
+    if MONGO_ENSURE_INDEX:
+        ensure_schedule_index(collection)
+
+    query = {}
+    if remaining:
+        query["department"] = {"$in": sorted({job.department for job in remaining})}
+        query["type"] = {"$in": sorted({job.table_type for job in remaining})}
+        periods = sorted({(job.month, job.year) for job in remaining})
+    else:
+        periods = [(month or defaults.month, year or defaults.year)]
+
+    if len(periods) == 1:
+        query["datetime"] = month_range(*periods[0])
+    else:
+        query["$or"] = [{"datetime": month_range(m, y)} for m, y in periods]
+
+    if MONGO_EXPLAIN_QUERY:
+        check_query_plan(query, collection)
+
+    df = prepare_schedule_frame(fetch_columns(collection, query, BATCH_FIELDS))
+    if not df.empty:
+        # แยกข้อมูลตาม (แผนก, ประเภท, เดือน, ปี)
+        groups = df.groupby(
+            ["department", "type", df["datetime"].dt.month, df["datetime"].dt.year],
+            sort=False
+        )
+        for (department, table_type, month_value, year_value), group in groups:
+            job = TableJob(department, table_type, int(month_value), int(year_value))
+            if remaining and job not in remaining:
+                continue
+            frames[job] = drop_missing_fields(group.reset_index(drop=True))
+            if snapshots is not None:
+                snapshots.put(job, frames[job])
+
+    return finish_batch_frames(jobs, frames)
+
+def list_jobs(start, end, collection=None, offline=OFFLINE_MODE):
+    """รายการงาน (แผนก, ประเภท, เดือน, ปี) ทั้งหมดตั้งแต่เดือน start ถึง end ((เดือน, ปี)) โดยไม่โหลดข้อมูลของตาราง
+
+    ใช้ aggregation ครั้งเดียวสำหรับทั้งช่วง offline=True ใช้รายการจาก snapshot
+    คืนค่าเรียงตาม (ปี, เดือน, แผนก, ประเภท)
+    """
+    if offline:
+        snapshots = get_snapshot_cache(offline)
+        if snapshots is None:
+            return []
+        return [job for month, year in month_sequence(start, end) for job in snapshots.jobs(month, year)]
+
+    if collection is None:
+        collection = connect_to_mongodb()
+    pipeline = [
+        {"$match": {"datetime": {"$gte": month_range(*start)["$gte"], "$lt": month_range(*end)["$lt"]}}},
+        {"$group": {"_id": {
+            "department": "$department",
+            "type": "$type",
+            "month": {"$month": "$datetime"},
+            "year": {"$year": "$datetime"},
+        }}},
+    ]
+    jobs = [
+        TableJob(key["department"], key["type"], key["month"], key["year"])
+        for key in (doc["_id"] for doc in collection.aggregate(pipeline, allowDiskUse=True))
+        if key.get("department") and key.get("type")
+    ]
+    return sorted(jobs, key=lambda job: (job.year, job.month, str(job.department), str(job.table_type)))
+
+def finish_batch_frames(jobs, frames):
+    """แจ้งงานที่ไม่พบข้อมูล และเรียงผลลัพธ์ตามลำดับของ jobs"""
+    if jobs:
+        for job in jobs:
+            if job not in frames:
+                month_name = month_names.get(job.month, f"เดือน {job.month}")
+                print(f"ไม่พบข้อมูลสำหรับ {job.department} ประเภท {job.table_type} ในเดือน {month_name} {job.year}")
+        frames = {job: frames[job] for job in jobs if job in frames}
+
+    return frames
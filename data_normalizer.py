@@ -0,0 +1,77 @@
+import pandas as pd
+
+# คอลัมน์ที่มีค่าไม่ซ้ำกันน้อย เก็บเป็น categorical เพื่อลดหน่วยความจำและให้กรอง/groupby เร็วขึ้น
+CATEGORICAL_FIELDS = ["role", "period_w", "period_h", "ward", "remark", "subward", "name"]
+
+# คอลัมน์จำนวนเอกสารของแต่ละแถว (มีเฉพาะข้อมูลจาก aggregation ที่รวมเอกสารซ้ำเป็นแถวเดียว)
+ROW_COUNT_FIELD = "rows"
+
+# ค่าตั้งต้นของคอลัมน์ที่ไม่มีในข้อมูล
+DEFAULT_VALUES = {
+    "role": "Staff",
+    "period_w": "",
+    "period_h": "",
+    "subward": "",
+    "remark": "",
+    "name": "",
+}
+
+# ชื่อวันแบบย่อ (ตรงกับ strftime('%a')) เรียงตาม dayofweek
+DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+def add_date_fields(df):
+    """สร้างคอลัมน์ day, date_num, date_key จาก datetime
+
+    จัดรูปแบบข้อความเฉพาะวันที่ที่ไม่ซ้ำกัน แล้วเก็บเป็น categorical แทนการ strftime ทุกแถว
+    """
+    dt = pd.to_datetime(df["datetime"])
+    df["datetime"] = dt
+    df["day"] = pd.Categorical.from_codes(dt.dt.dayofweek.to_numpy(), categories=DAY_NAMES)
+    df["date_num"] = dt.dt.day
+
+    codes, unique_dates = pd.factorize(dt.dt.normalize(), sort=True)
+    df["date_key"] = pd.Categorical.from_codes(codes, categories=unique_dates.strftime('%Y-%m-%d'))
+    return df
+
+def normalize_schedule_data(df):
+    """จัดรูปแบบข้อมูลตารางก่อนประมวลผล
+
+    - เติมคอลัมน์ที่ไม่มี (ถ้าไม่มี ward จะใช้ remark แทน)
+    - คัดลอก remark ไปเป็น subward เมื่อมีทั้ง ward และ remark (กรณี Neurology)
+    - สร้างคอลัมน์วันที่ และแปลงคอลัมน์ข้อความเป็น categorical
+    """
+    df = df.copy(deep=False)
+
+    # ตรวจสอบว่ามีฟิลด์ ward หรือควรใช้ remark แทน
+    has_ward = "ward" in df.columns
+    if not has_ward and "remark" in df.columns:
+        print(f"ไม่พบฟิลด์ 'ward' ในข้อมูล กำลังใช้ฟิลด์ 'remark' แทน")
+        df["ward"] = df["remark"]
+    elif not has_ward:
+        # ถ้าไม่มีทั้ง ward และ remark ให้สร้างคอลัมน์ ward เปล่า
+        print(f"ไม่พบทั้งฟิลด์ 'ward' และ 'remark' ในข้อมูล กำลังสร้างคอลัมน์ 'ward' เปล่า")
+        df["ward"] = ""
+    has_remark = "remark" in df.columns
+
+    # เติมคอลัมน์ที่ไม่มี
+    for field, value in DEFAULT_VALUES.items():
+        if field not in df.columns:
+            df[field] = value
+
+    # remark/subward ที่ไม่มีค่าถือเป็นค่าว่าง
+    df["remark"] = df["remark"].fillna("")
+    df["subward"] = df["subward"].fillna("")
+
+    # กรณี Neurology: ถ้ามี ward และ remark ให้ใช้ remark เป็น subward
+    if has_ward and has_remark:
+        print("พบทั้งฟิลด์ 'ward' และ 'remark' กำลังใช้ 'remark' เป็น subward")
+        df["subward"] = df["remark"].where(df["remark"] != "", df["subward"])
+
+    if "datetime" in df.columns:
+        df = add_date_fields(df)
+
+    for field in CATEGORICAL_FIELDS:
+        df[field] = df[field].astype("category")
+
+    df.attrs["normalized"] = True
+    return df
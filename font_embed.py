@@ -0,0 +1,68 @@
+import base64
+import importlib.util
+import io
+import os
+from functools import lru_cache
+from config import FONT_PATH, FONT_FAMILY, FONT_EMBED, FONT_URL
+from utils import write_file_atomic
+
+# fontTools ใช้เวลา import นาน จึง import เมื่อ subset ฟอนต์จริงเท่านั้น (ไม่ช้าลงเมื่อปิด FONT_EMBED หรือไม่มีไฟล์ฟอนต์)
+
+@lru_cache(maxsize=None)
+def read_font_file(path=FONT_PATH):
+    """อ่านไฟล์ฟอนต์ครั้งเดียวต่อ process (None ถ้าไม่มีไฟล์หรือไม่ได้ติดตั้ง fontTools)"""
+    if not path or not os.path.exists(path) or importlib.util.find_spec("fontTools") is None:
+        print(f"Warning: ไม่พบฟอนต์ {path} (หรือไม่ได้ติดตั้ง fontTools) จะไม่ฝังฟอนต์และใช้ฟอนต์ของระบบแทน")
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+@lru_cache(maxsize=256)
+def subset_font(path, chars):
+    """ตัดฟอนต์ให้เหลือเฉพาะ glyph ของตัวอักษรใน chars คืนค่าเป็น bytes ของไฟล์ TTF
+
+    เก็บ GSUB/GPOS ไว้ทั้งหมด เพื่อให้สระและวรรณยุกต์ไทยวางตำแหน่งได้ถูกต้อง
+    """
+    from fontTools import subset
+    from fontTools.ttLib import TTFont
+
+    options = subset.Options()
+    options.layout_features = ["*"]
+    options.hinting = False
+    options.notdef_outline = True
+    # ไม่เขียนเวลาปัจจุบันลง head.modified เพื่อให้ได้ bytes เดิมทุกครั้ง (HTML และ key ของ render cache ไม่เปลี่ยน)
+    font = TTFont(io.BytesIO(read_font_file(path)), recalcTimestamp=False)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(text=chars)
+    subsetter.subset(font)
+    buffer = io.BytesIO()
+    font.save(buffer)
+    return buffer.getvalue()
+
+def font_face_css(chars, path=FONT_PATH, family=FONT_FAMILY):
+    """@font-face ที่ฝังฟอนต์เป็น base64 (subset เฉพาะตัวอักษรใน chars) ไม่ต้องโหลดฟอนต์จากภายนอก
+
+    chars เป็นข้อความหรือ set ของตัวอักษรที่แสดงผล คืนค่า "" ถ้าปิด FONT_EMBED หรือไม่มีไฟล์ฟอนต์
+    """
+    if not FONT_EMBED or read_font_file(path) is None:
+        return ""
+    chars = "".join(sorted(set(chars) | {" "}))
+    encoded = base64.b64encode(subset_font(path, chars)).decode("ascii")
+    return (f"@font-face {{ font-family: '{family}'; "
+            f"src: url(data:font/ttf;base64,{encoded}) format('truetype'); }}")
+
+def download_font(url=FONT_URL, path=FONT_PATH, timeout=30):
+    """ดาวน์โหลดฟอนต์ลง FONT_PATH ถ้ายังไม่มี (รันครั้งเดียวบนเครื่องที่ต่อ network แล้วคัดลอกโฟลเดอร์ fonts ไปใช้)"""
+    if os.path.exists(path):
+        print(f"มีฟอนต์ {path} อยู่แล้ว")
+        return path
+    import urllib.request
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        data = response.read()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    write_file_atomic(path, data)
+    print(f"บันทึกฟอนต์ {path} เรียบร้อยแล้ว ({len(data) // 1024} KB)")
+    return path
+
+if __name__ == "__main__":
+    download_font()
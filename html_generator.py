@@ -1,5 +1,46 @@
-import pandas as pd
-from config import month_names, month_filter, year_filter, department_filter, table_type, title_mapping
+from jinja2 import Environment
+from config import month_names, title_mapping, default_job, HTML_RENDERER, TILE_MODE, TILE_MAX_COLUMNS
+from font_embed import font_face_css
+
+# template ของตาราง (compile ครั้งเดียว) ใช้ class สำหรับแถววันหยุดแทน CSS รายเซลล์ของ Styler
+TABLE_TEMPLATE = Environment(autoescape=False, trim_blocks=True).from_string("""\
+<style type="text/css">
+#schedule-table th {
+  background-color: #1B56FD;
+  font-weight: bold;
+  color: white;
+}
+#schedule-table td {
+  background-color: #AFDDFF;
+  text-align: center;
+  font-family: Prompt;
+  padding: 10px;
+}
+#schedule-table tr.weekend td {
+  background-color: #60B5FF;
+}
+</style>
+<table id="schedule-table" style="border-collapse:collapse; width:100%;">
+  <thead>
+{% for header_row in header_rows %}
+    <tr>
+{% for label, colspan in header_row %}
+      <th{% if colspan > 1 %} colspan="{{ colspan }}"{% endif %}>{{ label }}</th>
+{% endfor %}
+    </tr>
+{% endfor %}
+  </thead>
+  <tbody>
+{% for weekend, cells in rows %}
+    <tr{% if weekend %} class="weekend"{% endif %}>
+{% for cell in cells %}
+      <td>{{ cell }}</td>
+{% endfor %}
+    </tr>
+{% endfor %}
+  </tbody>
+</table>
+""")
 
 def highlight_weekend_rows(row):
     """ฟังก์ชั่นสำหรับไฮไลต์แถววันหยุดสุดสัปดาห์"""
@@ -7,23 +48,33 @@ def highlight_weekend_rows(row):
         return ['background-color: #60B5FF'] * len(row)
     return ['background-color: #AFDDFF'] * len(row)
 
-def generate_html(table_df):
-    """สร้าง HTML จาก DataFrame"""
-    # ดึงคอลัมน์จาก MultiIndex
-    day_col = [col for col in table_df.columns if col[3] == "Day"]  # ปรับ index ตามโครงสร้างใหม่
-    date_col = [col for col in table_df.columns if col[3] == "Date"]  # ปรับ index ตามโครงสร้างใหม่
-    content_cols = [col for col in table_df.columns if col not in day_col and col not in date_col]
-    
-    # กำหนด title ตาม type
-    title = title_mapping.get(table_type, f"{table_type}")
-    
-    # คำนวณจำนวนคอลัมน์ (ไม่นับคอลัมน์ Day และ Date)
-    num_columns = len(content_cols)
-    # กำหนดค่า zoom โดยขึ้นอยู่กับจำนวนคอลัมน์
-    zoom_level = 0.33 if num_columns >= 6 else 1.0
-    width_value = 3000 if num_columns >= 6 else 1200
-    
-    # สร้าง Styler
+def build_header_rows(columns):
+    """สร้างแถวหัวตารางจาก MultiIndex columns เป็น list ของ (ข้อความ, colspan) ต่อระดับ
+
+    รวมคอลัมน์ติดกันที่มีค่าเหมือนกันในระดับนั้นและระดับก่อนหน้าทั้งหมด (เหมือน Styler)
+    """
+    header_rows = []
+    for level in range(len(columns[0]) if len(columns) else 0):
+        header_row = []
+        previous = None
+        for col in columns:
+            prefix = col[:level + 1]
+            if header_row and prefix == previous:
+                label, colspan = header_row[-1]
+                header_row[-1] = (label, colspan + 1)
+            else:
+                header_row.append((col[level], 1))
+            previous = prefix
+        header_rows.append(header_row)
+    return header_rows
+
+def render_table_html(grid):
+    """สร้าง HTML ของตารางด้วย template ที่ compile ไว้ (grid เป็น ScheduleGrid)"""
+    rows = zip(grid.weekend_rows(), grid.rows())
+    return TABLE_TEMPLATE.render(header_rows=build_header_rows(grid.columns), rows=rows)
+
+def render_styler_html(table_df, day_col, date_col, content_cols):
+    """สร้าง HTML ของตารางด้วย pandas Styler (แบบเดิม)"""
     styled = (
         table_df.style
         .hide(axis="index")
@@ -44,6 +95,75 @@ def generate_html(table_df):
             'padding': '10px'
         }).set_table_attributes('style="border-collapse:collapse; width:100%;"')
     )
+    return styled.to_html(escape=False)
+
+def split_table_columns(grid, mode=None, max_columns=None):
+    """แบ่งตารางที่มีคอลัมน์เนื้อหามากกว่า max_columns เป็นหลายตาราง โดยทุกส่วนมีคอลัมน์ Day/Date
+
+    mode "role" แบ่งตาม role ก่อน (role ที่ยังกว้างเกินแบ่งต่อทีละ max_columns)
+    mode "columns" แบ่งทีละ max_columns คอลัมน์ ส่วน mode อื่นไม่แบ่ง
+    คืนค่าเป็น list ของ ScheduleGrid (มีตารางเดียวถ้าไม่ต้องแบ่ง)
+    """
+    mode = TILE_MODE if mode is None else mode
+    max_columns = max_columns or TILE_MAX_COLUMNS
+    if mode not in ("role", "columns") or grid.n_columns <= max_columns:
+        return [grid]
+
+    if mode == "role":
+        # คอลัมน์เรียงตาม role อยู่แล้ว จึงรวมคอลัมน์ที่ติดกันและมี role เดียวกัน
+        groups = []
+        for index, header in enumerate(grid.headers):
+            if groups and grid.headers[groups[-1][0]].role == header.role:
+                groups[-1].append(index)
+            else:
+                groups.append([index])
+    else:
+        groups = [list(range(grid.n_columns))]
+
+    tiles = []
+    for group in groups:
+        for start in range(0, len(group), max_columns):
+            tiles.append(grid.select_columns(group[start:start + max_columns]))
+    return tiles
+
+def generate_html_tiles(grid, job=None, renderer=None, mode=None, max_columns=None):
+    """สร้าง HTML ของแต่ละส่วนเมื่อแบ่งตาราง (คืนค่า list ที่มี HTML เดียวถ้าไม่ต้องแบ่ง)"""
+    tiles = split_table_columns(grid, mode, max_columns)
+    if len(tiles) == 1:
+        return [generate_html(grid, job, renderer)]
+    return [
+        generate_html(tile, job, renderer, part=(index, len(tiles)))
+        for index, tile in enumerate(tiles, start=1)
+    ]
+
+def generate_html(grid, job=None, renderer=None, part=None):
+    """สร้าง HTML จาก ScheduleGrid (part = (ลำดับ, จำนวนส่วนทั้งหมด) เมื่อเป็นส่วนหนึ่งของตารางที่ถูกแบ่ง)"""
+    job = job or default_job()
+    renderer = renderer or HTML_RENDERER
+    
+    # กำหนด title ตาม type
+    title = title_mapping.get(job.table_type, f"{job.table_type}")
+    
+    # คำนวณจำนวนคอลัมน์ (ไม่นับคอลัมน์ Day และ Date)
+    num_columns = grid.n_columns
+    # กำหนดค่า zoom โดยขึ้นอยู่กับจำนวนคอลัมน์
+    zoom_level = 0.33 if num_columns >= 6 else 1.0
+    width_value = 3000 if num_columns >= 6 else 1200
+    if part is not None:
+        # ส่วนของตารางที่ถูกแบ่งมีคอลัมน์ไม่มาก ใช้ความกว้างตามจำนวนคอลัมน์จริงโดยไม่ย่อ
+        zoom_level = 1.0
+        width_value = max(1200, 200 + 160 * num_columns)
+    
+    # สร้างตาราง (Styler เป็นทางเลือกสำรอง)
+    if renderer == "styler":
+        # Styler ต้องใช้ DataFrame จึงแปลงเฉพาะเมื่อเลือกใช้
+        table_df = grid.to_dataframe()
+        day_col = [col for col in table_df.columns if col[3] == "Day"]  # ปรับ index ตามโครงสร้างใหม่
+        date_col = [col for col in table_df.columns if col[3] == "Date"]  # ปรับ index ตามโครงสร้างใหม่
+        content_cols = [col for col in table_df.columns if col not in day_col and col not in date_col]
+        table_html = render_styler_html(table_df, day_col, date_col, content_cols)
+    else:
+        table_html = render_table_html(grid)
     
     # ปรับแต่ง CSS เพิ่มเติมเพื่อรองรับส่วนหัวตารางหลายแถว
     css_styles = f"""
@@ -143,7 +263,12 @@ def generate_html(table_df):
     }}
     """
     
-    month_name = month_names.get(month_filter, f"เดือน {month_filter}")
+    month_name = month_names.get(job.month, f"เดือน {job.month}")
+    part_label = f" (ส่วนที่ {part[0]}/{part[1]})" if part is not None else ""
+    titles = [f"ชื่อตาราง : {title}{part_label}", f"แผนก : {job.department}", f"ประจำเดือน : {month_name} {job.year}"]
+
+    # ฝังฟอนต์ Prompt เฉพาะตัวอักษรที่ใช้ (ไม่โหลดจากภายนอก wkhtmltoimage จึงไม่ต้องรอ network)
+    font_face = font_face_css(grid.characters().union(*titles))
     
     # สร้าง HTML content
     html_content = f"""
@@ -152,16 +277,16 @@ def generate_html(table_df):
         <meta charset="utf-8">
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
         <style>
+        {font_face}
         {css_styles}
         </style>
-        <link href="https://fonts.googleapis.com/css2?family=Prompt&display=swap" rel="stylesheet">
     </head>
     <body>
-    <h2><center>ชื่อตาราง : {title}</center></h2>
-    <h3><center>แผนก : {department_filter}</center></h3>
-    <h3><center>ประจำเดือน : {month_name} {year_filter}</center></h3>
+    <h2><center>{titles[0]}</center></h2>
+    <h3><center>{titles[1]}</center></h3>
+    <h3><center>{titles[2]}</center></h3>
     <div class="table-container">
-    {styled.to_html(escape=False)}
+    {table_html}
     </div>
     </body>
     </html>
@@ -1,49 +1,101 @@
 import os
-import uuid
-import imgkit
-from config import WKHTMLTOIMAGE_PATH, table_type, month_filter, year_filter, month_names, title_mapping
-
-def export_to_image(html_content):
-    """ส่งออกตารางเป็นรูปภาพ"""
-    # ตั้งค่า path สำหรับ wkhtmltoimage
-    config = imgkit.config(wkhtmltoimage=WKHTMLTOIMAGE_PATH)
-    
-    # สร้างชื่อไฟล์ชั่วคราว
-    temp_html_file = f"temp_{uuid.uuid4().hex}.html"
-    temp_png_file = f"temp_{uuid.uuid4().hex}.png"
-    
+import subprocess
+from contextlib import nullcontext
+from utils import write_file_atomic
+from render_cache import RenderCache, get_render_cache
+from config import WKHTMLTOIMAGE_PATH, RENDER_TIMEOUT, OUTPUT_DIR, month_names, title_mapping, default_job
+
+# ตัวเลือกของ wkhtmltoimage เมื่อรับ HTML ทาง stdin และส่ง PNG ออกทาง stdout
+# HTML ไม่มี JavaScript และไม่อ้างถึงไฟล์ภายนอก (ฟอนต์ฝังใน HTML) ถ้ามี resource ใดโหลดไม่ได้ให้ข้ามไป ไม่ให้ล้มทั้งงาน
+RENDER_OPTIONS = {
+    "format": "png",
+    "encoding": "UTF-8",
+    "quiet": "",
+    "disable-javascript": "",
+    "load-error-handling": "ignore",
+    "load-media-error-handling": "ignore",
+}
+
+def render_image_bytes(html_content, config=None, timeout=RENDER_TIMEOUT, options=None):
+    """ส่ง HTML ให้ wkhtmltoimage ทาง stdin แล้วคืนค่ารูปภาพ PNG เป็น bytes (ไม่มีไฟล์ชั่วคราว)"""
+    # import เมื่อต้อง render จริง (งานที่ได้ผลจาก cache หรือสร้างแค่ HTML ไม่ต้องโหลด)
+    import imgkit
+    if config is None:
+        config = imgkit.config(wkhtmltoimage=WKHTMLTOIMAGE_PATH)
+
+    args = imgkit.IMGKit(html_content, "string", options={**RENDER_OPTIONS, **(options or {})}, config=config).command()
+    try:
+        # subprocess.run จะ kill wkhtmltoimage เมื่อเกินเวลา
+        result = subprocess.run(args, input=html_content.encode("utf-8"), capture_output=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise OSError(f"wkhtmltoimage ใช้เวลาเกิน {timeout} วินาที (RENDER_TIMEOUT)") from None
+    if result.returncode != 0 or not result.stdout:
+        stderr = result.stderr.decode("utf-8", errors="replace")
+        raise OSError(f"wkhtmltoimage exited with non-zero code {result.returncode}. error:\n{stderr}")
+    return result.stdout
+
+def render_settings(options=None):
+    """ค่าการ render ที่มีผลกับรูปภาพ (ใช้เป็นส่วนหนึ่งของ key ใน cache)"""
+    return {"wkhtmltoimage": WKHTMLTOIMAGE_PATH, "options": {**RENDER_OPTIONS, **(options or {})}}
+
+def render_image_cached(html_content, timeout=RENDER_TIMEOUT, options=None, cache=None):
+    """render HTML เป็น PNG bytes โดยใช้ผลเดิมจาก cache ถ้า HTML และค่าการ render ไม่เปลี่ยน"""
+    cache = cache or get_render_cache()
+    if cache is None:
+        return render_image_bytes(html_content, timeout=timeout, options=options)
+
+    key = RenderCache.make_key(html_content, render_settings(options))
+    image_bytes = cache.get(key)
+    if image_bytes is None:
+        image_bytes = render_image_bytes(html_content, timeout=timeout, options=options)
+        cache.put(key, image_bytes)
+    return image_bytes
+
+def output_file_name(job, extension, part=None):
+    """ชื่อไฟล์ผลลัพธ์ของแต่ละงาน (มีชื่อแผนกเพื่อไม่ให้ชนกันเมื่อรันหลายงานพร้อมกัน)
+
+    part คือลำดับของรูปเมื่อแบ่งตารางเป็นหลายรูป (เริ่มที่ 1)
+    """
+    name = f"{job.department}_{job.table_type}_{job.month}_{job.year}"
+    if part is not None:
+        name = f"{name}_part{part}"
+    # ป้องกันชื่อแผนก/ประเภทที่มีตัวคั่น path
+    for separator in {"/", "\\", os.sep}:
+        name = name.replace(separator, "-")
+    return f"{name}.{extension}"
+
+def save_html_file(job, html_content, output_dir=None, part=None):
+    """บันทึกไฟล์ HTML ของงานลงโฟลเดอร์ผลลัพธ์ คืนค่า path ของไฟล์"""
+    output_dir = output_dir or OUTPUT_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    return write_file_atomic(os.path.join(output_dir, output_file_name(job, "html", part)), html_content.encode("utf-8"))
+
+def save_table_files(job, html_content, image_bytes, output_dir=None, part=None):
+    """บันทึกไฟล์ HTML และ PNG ของงานลงโฟลเดอร์ผลลัพธ์ คืนค่า (path HTML, path PNG)"""
+    output_dir = output_dir or OUTPUT_DIR
+    html_file = save_html_file(job, html_content, output_dir, part)
+    png_file = write_file_atomic(os.path.join(output_dir, output_file_name(job, "png", part)), image_bytes)
+    return html_file, png_file
+
+def export_to_image(html_content, job=None, output_dir=None, timeout=RENDER_TIMEOUT, metrics=None, part=None):
+    """ส่งออกตารางเป็นรูปภาพ (metrics เป็น PipelineMetrics สำหรับบันทึกขั้นตอน export, part คือลำดับรูปเมื่อแบ่งตาราง)"""
+    job = job or default_job()
+    stage = "export" if part is None else f"export_part{part}"
+
     try:
-        # บันทึกเป็น HTML ด้วยชื่อชั่วคราว
-        with open(temp_html_file, "w", encoding='utf-8') as f:
-            f.write(html_content)
-        
-        # แปลงเป็นรูปภาพ
-        imgkit.from_file(temp_html_file, temp_png_file, config=config)
-        
-        # กำหนดชื่อไฟล์เป้าหมาย
-        target_html_file = f"{table_type}_{month_filter}_{year_filter}.html"
-        target_png_file = f"{table_type}_{month_filter}_{year_filter}.png"
-        
-        # เปลี่ยนชื่อไฟล์
-        if os.path.exists(target_html_file):
-            os.remove(target_html_file)
-        if os.path.exists(target_png_file):
-            os.remove(target_png_file)
-            
-        os.rename(temp_html_file, target_html_file)
-        os.rename(temp_png_file, target_png_file)
-        
-        month_name = month_names.get(month_filter, f"เดือน {month_filter}")
-        title = title_mapping.get(table_type, f"ตาราง {table_type} ")
-        print(f"สร้างตาราง {title} สำหรับเดือน {month_name} {year_filter} เรียบร้อยแล้ว")
-        
+        # แปลงเป็นรูปภาพในหน่วยความจำ แล้วบันทึกลงโฟลเดอร์ผลลัพธ์
+        with (metrics.stage(stage) if metrics else nullcontext({})) as info:
+            image_bytes = render_image_cached(html_content, timeout=timeout)
+            save_table_files(job, html_content, image_bytes, output_dir, part)
+            info["image_bytes"] = len(image_bytes)
+
+        month_name = month_names.get(job.month, f"เดือน {job.month}")
+        title = title_mapping.get(job.table_type, f"ตาราง {job.table_type} ")
+        part_label = f" (ส่วนที่ {part})" if part is not None else ""
+        print(f"สร้างตาราง {title} สำหรับเดือน {month_name} {job.year}{part_label} เรียบร้อยแล้ว")
+
         return True
-        
+
     except Exception as e:
         print(f"เกิดข้อผิดพลาดในการแปลงไฟล์: {e}")
-        # ลบไฟล์ชั่วคราวในกรณีที่เกิดข้อผิดพลาด
-        if os.path.exists(temp_html_file):
-            os.remove(temp_html_file)
-        if os.path.exists(temp_png_file):
-            os.remove(temp_png_file)
-        return False
\ No newline at end of file
+        return False
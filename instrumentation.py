@@ -0,0 +1,128 @@
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from config import METRICS_ENABLED, METRICS_FILE, PROFILE_MODE, PROFILE_DIR
+from image_exporter import output_file_name
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_emit_lock = threading.Lock()
+
+def max_rss_mb():
+    """หน่วยความจำสูงสุดของ process (MB) หรือ None ถ้าระบบไม่รองรับ"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux รายงานเป็น KB ส่วน macOS เป็น bytes
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+class PipelineMetrics:
+    """เก็บเวลาและข้อมูลของแต่ละขั้นตอนสำหรับหนึ่งตาราง
+
+    ใช้ stage(name) ครอบแต่ละขั้นตอน แล้วใส่ค่าเพิ่มลงใน dict ที่ได้ (เช่น rows_out)
+    เมื่อปิดใช้งาน stage() ไม่วัดอะไรเลย และ emit() ไม่เขียนไฟล์
+    """
+
+    def __init__(self, job, enabled=None, profile=None):
+        self.job = job
+        self.profile_mode = PROFILE_MODE if profile is None else set(profile)
+        self.enabled = (METRICS_ENABLED or bool(self.profile_mode)) if enabled is None else enabled
+        self.trace_memory = self.enabled and "tracemalloc" in self.profile_mode
+        self.stages = {}
+        self.profiling = False
+
+    @contextmanager
+    def stage(self, name):
+        """วัดเวลา (และหน่วยความจำสูงสุดถ้าเปิด tracemalloc) ของหนึ่งขั้นตอน
+
+        tracemalloc เริ่ม/หยุดใน profile() ครั้งเดียว stage ที่ทำงานนอก profile() จะไม่มี peak_mb
+        (stage ที่ทำงานพร้อมกันหลาย thread เช่น export_part ได้ค่าสูงสุดนับจาก stage ที่เริ่มล่าสุด)
+        """
+        info = {}
+        if not self.enabled:
+            yield info
+            return
+
+        trace_memory = self.trace_memory and tracemalloc.is_tracing()
+        if trace_memory:
+            tracemalloc.reset_peak()
+
+        start = time.perf_counter()
+        try:
+            yield info
+        except BaseException as e:
+            info["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            info["seconds"] = time.perf_counter() - start
+            if trace_memory and tracemalloc.is_tracing():
+                info["peak_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            self.stages[name] = info
+
+    @contextmanager
+    def profile(self):
+        """ครอบทั้ง pipeline ของตารางด้วย cProfile (เมื่อ PROFILE_MODE มี cprofile)
+
+        และเริ่ม tracemalloc ครั้งเดียวสำหรับทุก stage (เมื่อ PROFILE_MODE มี tracemalloc)
+        เรียกซ้อนกันได้ (เช่น main เรียก build_job_html) เฉพาะชั้นนอกสุดที่เริ่มและหยุดการวัด
+        """
+        if self.profiling or not self.enabled:
+            yield
+            return
+
+        self.profiling = True
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        profiler = None
+        if "cprofile" in self.profile_mode:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            yield
+        finally:
+            self.profiling = False
+            if started_tracing:
+                tracemalloc.stop()
+            if profiler is not None:
+                profiler.disable()
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                path = os.path.join(PROFILE_DIR, output_file_name(self.job, "prof"))
+                profiler.dump_stats(path)
+                self.stages.setdefault("profile", {})["file"] = path
+
+    def record(self):
+        """ข้อมูลของตารางเป็น dict ที่แปลงเป็น JSON ได้"""
+        return {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "department": self.job.department,
+            "table_type": self.job.table_type,
+            "month": self.job.month,
+            "year": self.job.year,
+            "total_seconds": sum(info.get("seconds", 0) for info in self.stages.values()),
+            "max_rss_mb": max_rss_mb(),
+            "stages": self.stages,
+        }
+
+    def emit(self, path=None):
+        """บันทึกข้อมูลของตารางเป็น JSON หนึ่งบรรทัด"""
+        if not self.enabled:
+            return None
+        path = path or METRICS_FILE
+        line = json.dumps(self.record(), ensure_ascii=False, default=str)
+        with _emit_lock:
+            if path == "-":
+                print(line)
+            else:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        return line
@@ -1,24 +1,149 @@
-import re
-from data_loader import load_schedule_data
-from table_processor import process_table_data
-from html_generator import generate_html
-from image_exporter import export_to_image
+import argparse
+import os
+import sys
 
-def main():
+# คำสั่งของ CLI (ถ้าไม่ระบุจะใช้ generate)
+COMMANDS = ("generate", "batch", "backfill", "watch", "serve")
+
+def main(output_format="png"):
     """เป็นจุดเริ่มต้นของโปรแกรม"""
-    # 1. โหลดข้อมูล
-    df = load_schedule_data()
-    if df is None:
-        return
-    
-    # 2. ประมวลผลข้อมูลตาราง
-    table_df, column_keys = process_table_data(df)
-    
-    # 3. สร้าง HTML
-    html_content = generate_html(table_df)
-    
-    # 4. ส่งออกเป็นรูปภาพ
-    export_to_image(html_content)
+    # import โมดูลที่ใช้ pandas/pymongo เมื่อสั่งงานจริงเท่านั้น
+    from config import default_job, IMAGE_BACKEND, RENDER_WORKERS
+    from data_loader import load_schedule_data
+    from batch import build_job_html, build_job_svg
+    from image_exporter import save_html_file
+    from render_service import RenderService
+    from instrumentation import PipelineMetrics
+
+    job = default_job()
+    metrics = PipelineMetrics(job)
+
+    with metrics.profile():
+        # 1. โหลดข้อมูล
+        with metrics.stage("load") as info:
+            df = load_schedule_data(job)
+            info["rows_out"] = 0 if df is None else len(df)
+        if df is None:
+            metrics.emit()
+            return
+
+        # 2-4. จัดรูปแบบ ประมวลผล แล้ววาดตารางเป็น SVG โดยตรง (ไม่ต้องสร้าง HTML และไม่ใช้ wkhtmltoimage)
+        if IMAGE_BACKEND == "svg" and output_format != "html":
+            build_job_svg(job, df, output_dir=None, metrics=metrics)
+            metrics.emit()
+            return
+
+        # 2-3. จัดรูปแบบ ประมวลผล และสร้าง HTML (หลายส่วนเมื่อเปิดการแบ่งตารางที่กว้างเกินไป)
+        html_parts, _ = build_job_html(job, df, metrics=metrics)
+
+        # 4. ส่งออกเป็นรูปภาพ (หรือบันทึกเฉพาะ HTML)
+        if output_format == "html":
+            parts = [None] if len(html_parts) == 1 else range(1, len(html_parts) + 1)
+            for part, html_content in zip(parts, html_parts):
+                print(f"บันทึกไฟล์ {save_html_file(job, html_content, part=part)} เรียบร้อยแล้ว")
+        else:
+            # render แต่ละส่วนแบบขนาน (ไม่เกิน RENDER_WORKERS process พร้อมกัน)
+            with RenderService(workers=min(len(html_parts), RENDER_WORKERS)) as renderer:
+                for future in renderer.submit_tiles(html_parts, job, metrics=metrics):
+                    future.result()
+
+    metrics.emit()
+
+def build_parser():
+    """สร้าง argument parser
+
+    option ที่ dest เป็นตัวพิมพ์ใหญ่คือชื่อตัวแปร env ใน config.py ค่าที่ระบุจะถูกตั้งเป็น env
+    ก่อน import config จึงใช้แทนการแก้ไฟล์หรือ .env ได้ทุกค่า
+    """
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--offline", dest="OFFLINE_MODE", action="store_const", const="1",
+                        help="อ่านข้อมูลจาก snapshot อย่างเดียว ไม่เชื่อมต่อ MongoDB")
+    common.add_argument("--aggregate", dest="MONGO_AGGREGATE", action="store_const", const="1",
+                        help="รวมข้อมูลเป็นเซลล์ของตารางบน MongoDB ด้วย aggregation pipeline")
+    common.add_argument("--no-snapshot", dest="SNAPSHOT_ENABLED", action="store_const", const="0",
+                        help="ไม่ใช้ snapshot ข้อมูล")
+    common.add_argument("--no-render-cache", dest="RENDER_CACHE_ENABLED", action="store_const", const="0",
+                        help="ไม่ใช้ cache รูปภาพ")
+    common.add_argument("--metrics", dest="METRICS_ENABLED", action="store_const", const="1",
+                        help="บันทึกเวลาของแต่ละขั้นตอนลง METRICS_FILE")
+    common.add_argument("--profile", dest="PROFILE_MODE", help="cprofile, tracemalloc หรือ cprofile,tracemalloc")
+    common.add_argument("--wkhtmltoimage", dest="WKHTMLTOIMAGE_PATH", help="path ของ wkhtmltoimage")
+    common.add_argument("--backend", dest="IMAGE_BACKEND", choices=["wkhtmltoimage", "svg"],
+                        help="svg = วาดตารางเป็น SVG ด้วย Python ไม่ต้องใช้ wkhtmltoimage")
+    common.add_argument("--tile-mode", dest="TILE_MODE", choices=["role", "columns"],
+                        help="แบ่งตารางที่กว้างเกินไปเป็นหลายรูป")
+    common.add_argument("--tile-max-columns", dest="TILE_MAX_COLUMNS", type=int, help="จำนวนคอลัมน์เนื้อหาสูงสุดต่อรูป")
+
+    period = argparse.ArgumentParser(add_help=False)
+    period.add_argument("--month", dest="TABLE_MONTH", type=int)
+    period.add_argument("--year", dest="TABLE_YEAR", type=int)
+
+    parser = argparse.ArgumentParser(description="สร้างตารางเวรจากข้อมูลใน MongoDB")
+    commands = parser.add_subparsers(dest="command", metavar="{" + ",".join(COMMANDS) + "}")
+
+    generate = commands.add_parser("generate", parents=[common, period], help="สร้างหนึ่งตาราง (ค่าตั้งต้น)")
+    generate.add_argument("--department", dest="TABLE_DEPARTMENT")
+    generate.add_argument("--type", dest="TABLE_TYPE")
+    generate.add_argument("--format", choices=["png", "html"], default="png", help="html = บันทึกเฉพาะ HTML ไม่ render รูปภาพ")
+    generate.add_argument("--output-dir", dest="OUTPUT_DIR")
+    generate.add_argument("--renderer", dest="HTML_RENDERER", choices=["jinja", "styler"])
+    generate.add_argument("--timeout", dest="RENDER_TIMEOUT", type=float, help="เวลาสูงสุดในการ render (วินาที)")
+
+    batch = commands.add_parser("batch", parents=[common, period], help="สร้างทุกแผนก/ประเภทของเดือน")
+    batch.add_argument("--workers", dest="BATCH_WORKERS", type=int)
+    batch.add_argument("--render-workers", dest="RENDER_WORKERS", type=int)
+    batch.add_argument("--output-dir", dest="BATCH_OUTPUT_DIR")
+
+    backfill = commands.add_parser("backfill", parents=[common], help="สร้างตารางย้อนหลังหลายเดือน (ทำต่อจากเดิมได้)")
+    backfill.add_argument("--start", dest="BACKFILL_START", required=True, help="เดือนแรก YYYY-MM")
+    backfill.add_argument("--end", dest="BACKFILL_END", help="เดือนสุดท้าย YYYY-MM (ค่าตั้งต้นคือเดือนปัจจุบัน)")
+    backfill.add_argument("--manifest", dest="BACKFILL_MANIFEST", help="ไฟล์บันทึกตารางที่สร้างเสร็จแล้ว")
+    backfill.add_argument("--workers", dest="BATCH_WORKERS", type=int)
+    backfill.add_argument("--render-workers", dest="RENDER_WORKERS", type=int)
+    backfill.add_argument("--output-dir", dest="BATCH_OUTPUT_DIR")
+
+    watch = commands.add_parser("watch", parents=[common], help="สร้างใหม่เฉพาะตารางที่ข้อมูลเปลี่ยน")
+    watch.add_argument("--debounce", dest="WATCH_DEBOUNCE", type=float)
+    watch.add_argument("--poll-interval", dest="WATCH_POLL_INTERVAL", type=float)
+    watch.add_argument("--workers", dest="BATCH_WORKERS", type=int)
+    watch.add_argument("--output-dir", dest="BATCH_OUTPUT_DIR")
+
+    serve = commands.add_parser("serve", parents=[common], help="เปิด HTTP service สำหรับขอตาราง")
+    serve.add_argument("--host", dest="SERVER_HOST")
+    serve.add_argument("--port", dest="SERVER_PORT", type=int)
+    serve.add_argument("--cache-size", dest="SERVER_CACHE_SIZE", type=int)
+
+    return parser
+
+def apply_env_overrides(args):
+    """ตั้งค่าจาก argument เป็นตัวแปร env (ต้องเรียกก่อน import config)"""
+    for name, value in vars(args).items():
+        if name.isupper() and value is not None:
+            os.environ[name] = str(value)
+
+def cli(argv=None):
+    """จุดเริ่มต้นของ command line"""
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] not in COMMANDS + ("-h", "--help"):
+        argv = ["generate"] + argv
+
+    args = build_parser().parse_args(argv)
+    apply_env_overrides(args)
+
+    if args.command == "generate":
+        main(args.format)
+    elif args.command == "batch":
+        from batch import run_batch
+        run_batch()
+    elif args.command == "backfill":
+        from backfill import run_backfill
+        run_backfill()
+    elif args.command == "watch":
+        from watcher import watch
+        watch()
+    elif args.command == "serve":
+        from server import serve
+        serve()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    cli()
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from config import RENDER_CACHE_ENABLED, RENDER_CACHE_DIR, RENDER_CACHE_MAX_MB, RENDER_CACHE_MAX_AGE_DAYS
+from utils import write_file_atomic
+
+class RenderCache:
+    """cache รูปภาพที่ render แล้ว โดยใช้ hash ของ HTML และค่าการ render เป็น key
+
+    เก็บเป็นไฟล์ <key>.png ในโฟลเดอร์ cache และลบไฟล์เมื่อเก่ากว่า max_age_days
+    หรือเมื่อขนาดรวมเกิน max_mb (ลบไฟล์ที่ใช้ล่าสุดนานที่สุดก่อน)
+    """
+
+    def __init__(self, directory=RENDER_CACHE_DIR, max_mb=RENDER_CACHE_MAX_MB, max_age_days=RENDER_CACHE_MAX_AGE_DAYS):
+        self.directory = directory
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_age = max_age_days * 24 * 60 * 60
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(html_content, settings=None):
+        """สร้าง key จาก HTML สุดท้ายและค่าการ render"""
+        digest = hashlib.sha256(html_content.encode("utf-8"))
+        digest.update(json.dumps(settings or {}, sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.png")
+
+    def get(self, key):
+        """คืนค่า PNG bytes ถ้ามีใน cache และยังไม่หมดอายุ (ไม่เช่นนั้นคืนค่า None)"""
+        path = self.path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                os.remove(path)
+                raise FileNotFoundError(path)
+            with open(path, "rb") as f:
+                data = f.read()
+            # อัปเดตเวลาเพื่อใช้เรียงลำดับการลบ (ใช้ล่าสุดอยู่ท้าย)
+            os.utime(path)
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """บันทึก PNG bytes ลง cache แล้วลบไฟล์เก่าตามเงื่อนไข"""
+        write_file_atomic(self.path(key), data)
+        self.evict()
+
+    def evict(self):
+        """ลบไฟล์ที่หมดอายุ และลบไฟล์ที่ใช้ล่าสุดนานที่สุดจนขนาดรวมไม่เกินที่กำหนด"""
+        with self.lock:
+            now = time.time()
+            entries = []
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith(".png") or entry.name.startswith("."):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if now - stat.st_mtime > self.max_age:
+                    # process อื่นที่ใช้ cache ร่วมกันอาจลบไฟล์นี้ไปก่อนแล้ว
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def stats(self):
+        """คืนค่าสถิติการใช้งาน cache"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_render_cache():
+    """คืนค่า cache ที่ใช้ร่วมกันทั้ง process (None ถ้าปิดใช้งานใน config)"""
+    global _default_cache
+    if not RENDER_CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = RenderCache()
+    return _default_cache
@@ -0,0 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+from config import RENDER_WORKERS, RENDER_TIMEOUT, RENDER_RETRIES
+from image_exporter import export_to_image
+
+class RenderService:
+    """บริการ render รูปภาพแบบขนาน
+
+    worker (thread) แต่ละตัวรับงานจากคิวเดียวกันและทำได้หลายงานต่อเนื่อง
+    การ render จริงเกิดใน process ของ wkhtmltoimage จึงใช้ thread ได้โดยไม่ติด GIL
+    แต่ละงานมี timeout และลองใหม่ได้ตามจำนวน retries
+    """
+
+    def __init__(self, workers=RENDER_WORKERS, timeout=RENDER_TIMEOUT, retries=RENDER_RETRIES):
+        self.timeout = timeout
+        self.retries = retries
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="render")
+
+    def render(self, html_content, job=None, output_dir=None, metrics=None, part=None):
+        """render หนึ่งงาน (ลองใหม่เมื่อไม่สำเร็จ) คืนค่า True/False"""
+        for attempt in range(self.retries + 1):
+            if attempt:
+                print(f"กำลังลองใหม่ครั้งที่ {attempt}/{self.retries}")
+            if export_to_image(html_content, job, output_dir=output_dir, timeout=self.timeout, metrics=metrics, part=part):
+                return True
+        return False
+
+    def submit(self, html_content, job=None, output_dir=None, metrics=None, part=None):
+        """ส่งงานเข้าคิว คืนค่าเป็น Future ของผลลัพธ์ True/False"""
+        return self.executor.submit(self.render, html_content, job, output_dir, metrics, part)
+
+    def submit_tiles(self, html_parts, job=None, output_dir=None, metrics=None):
+        """ส่งทุกส่วนของตารางเข้าคิว (ตารางที่ไม่ได้แบ่งมีส่วนเดียวและใช้ชื่อไฟล์เดิม) คืนค่า list ของ Future"""
+        if len(html_parts) == 1:
+            return [self.submit(html_parts[0], job, output_dir, metrics)]
+        return [
+            self.submit(html_content, job, output_dir, metrics, part)
+            for part, html_content in enumerate(html_parts, start=1)
+        ]
+
+    def render_many(self, documents, output_dir=None):
+        """render หลายงานพร้อมกัน
+
+        documents เป็น iterable ของ (html_content, job) หรือ (html_content, job, part)
+        คืนค่าผลลัพธ์ตามลำดับเดียวกัน
+        """
+        futures = [self.submit(document[0], document[1], output_dir, None, *document[2:]) for document in documents]
+        return [future.result() for future in futures]
+
+    def close(self, wait=True):
+        """ปิด worker ทั้งหมด (รอให้งานในคิวเสร็จก่อนถ้า wait=True)"""
+        self.executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def export_many_to_image(documents, output_dir=None, workers=RENDER_WORKERS, timeout=RENDER_TIMEOUT, retries=RENDER_RETRIES):
+    """ส่งออกหลายตารางเป็นรูปภาพแบบขนาน (documents เป็น iterable ของ (html_content, job))"""
+    with RenderService(workers=workers, timeout=timeout, retries=retries) as service:
+        return service.render_many(documents, output_dir=output_dir)
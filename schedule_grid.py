@@ -0,0 +1,149 @@
+import sys
+import numpy as np
+import pandas as pd
+
+# หัวคอลัมน์คงที่ของตาราง (5 ระดับเหมือนคอลัมน์เนื้อหา)
+DAY_HEADER = ("", "", "", "Day", "")
+DATE_HEADER = ("", "", "", "Date", "")
+WEEKEND_DAYS = ("Sat", "Sun")
+NAME_SEPARATOR = ",<br>"
+
+class ColumnHeader:
+    """หัวคอลัมน์เนื้อหาหนึ่งคอลัมน์ (ward เป็นชื่อที่จัดรูปแบบแล้ว, key เป็น column key เดิม)"""
+
+    __slots__ = ("role", "period_w", "period_h", "ward", "subward", "key")
+
+    def __init__(self, role, period_w, period_h, ward, subward, key):
+        self.role = role
+        self.period_w = period_w
+        self.period_h = period_h
+        self.ward = ward
+        self.subward = subward
+        self.key = key
+
+    def as_tuple(self):
+        return (self.role, self.period_w, self.period_h, self.ward, self.subward)
+
+    def __repr__(self):
+        return f"ColumnHeader{self.as_tuple()}"
+
+class ScheduleGrid:
+    """ตารางเวรแบบกะทัดรัด ใช้เป็นโครงสร้างกลางของทุกตัวสร้างผลลัพธ์ (HTML, SVG, DataFrame)
+
+    แถวคือวันที่ คอลัมน์คือ headers (ไม่รวม Day/Date) ชื่อคนเก็บครั้งเดียวใน names
+    เซลล์ที่มีชื่อเก็บแบบ sparse: cell_ids เป็นตำแหน่ง row * n_columns + column (เรียงจากน้อยไปมาก)
+    และชื่อของเซลล์ที่ i คือ name_codes[cell_starts[i]:cell_starts[i + 1]] ตามลำดับที่พบในข้อมูล
+    """
+
+    __slots__ = ("day_names", "date_nums", "headers", "names", "cell_ids", "cell_starts", "name_codes", "attrs")
+
+    def __init__(self, day_names, date_nums, headers, names, cell_ids, cell_starts, name_codes, attrs=None):
+        self.day_names = list(day_names)
+        self.date_nums = np.asarray(date_nums)
+        self.headers = tuple(headers)
+        self.names = [sys.intern(str(name)) for name in names]
+        self.cell_ids = np.asarray(cell_ids, dtype=np.int64)
+        self.cell_starts = np.asarray(cell_starts, dtype=np.int64)
+        self.name_codes = np.asarray(name_codes, dtype=np.int32)
+        self.attrs = dict(attrs or {})
+
+    @classmethod
+    def from_cells(cls, day_names, date_nums, headers, rows, columns, names, attrs=None):
+        """สร้างจาก list ของเซลล์ (แถว, คอลัมน์, ชื่อ) ที่ไม่ซ้ำกัน ลำดับชื่อในเซลล์ตามลำดับที่ส่งมา"""
+        n_columns = len(headers)
+        ids = np.asarray(rows, dtype=np.int64) * n_columns + np.asarray(columns, dtype=np.int64)
+        name_codes, name_values = pd.factorize(pd.Series(names, dtype=object).astype(str))
+
+        # stable sort เพื่อให้ชื่อในเซลล์เดียวกันยังเรียงตามลำดับที่พบ
+        order = np.argsort(ids, kind="stable")
+        ids = ids[order]
+        cell_ids, cell_starts = np.unique(ids, return_index=True)
+        cell_starts = np.append(cell_starts, len(ids))
+        return cls(day_names, date_nums, headers, name_values, cell_ids, cell_starts, name_codes[order], attrs)
+
+    @property
+    def n_rows(self):
+        return len(self.day_names)
+
+    @property
+    def n_columns(self):
+        """จำนวนคอลัมน์เนื้อหา (ไม่รวม Day/Date)"""
+        return len(self.headers)
+
+    def __len__(self):
+        return self.n_rows
+
+    @property
+    def columns(self):
+        """หัวตารางทั้งหมดเป็น tuple 5 ระดับ (รวม Day/Date) แบบเดียวกับ MultiIndex เดิม"""
+        return [DAY_HEADER, DATE_HEADER] + [header.as_tuple() for header in self.headers]
+
+    @property
+    def column_keys(self):
+        return ["Day", "Date"] + [header.key for header in self.headers]
+
+    def weekend_rows(self):
+        return [day in WEEKEND_DAYS for day in self.day_names]
+
+    def characters(self):
+        """ตัวอักษรทั้งหมดที่แสดงในตาราง (หัวตาราง, วัน, วันที่, ชื่อ และตัวคั่นชื่อ) ใช้ subset ฟอนต์"""
+        labels = [label for column in self.columns for label in column]
+        dates = [str(date) for date in self.date_nums.tolist()]
+        return set("".join([*self.names, *self.day_names, *dates, *labels, NAME_SEPARATOR.replace("<br>", "")]))
+
+    def cell_texts(self, separator=NAME_SEPARATOR):
+        """คืนค่า (row, column, ข้อความ) ของเซลล์ที่มีชื่อ"""
+        names = self.names
+        codes = self.name_codes.tolist()
+        starts = self.cell_starts.tolist()
+        for index, cell_id in enumerate(self.cell_ids.tolist()):
+            row, column = divmod(cell_id, self.n_columns)
+            yield row, column, separator.join(names[code] for code in codes[starts[index]:starts[index + 1]])
+
+    def cell_matrix(self, separator=NAME_SEPARATOR):
+        """เนื้อหาเป็น list ของแถว (เซลล์ว่างเป็น "")"""
+        matrix = [[""] * self.n_columns for _ in range(self.n_rows)]
+        for row, column, text in self.cell_texts(separator):
+            matrix[row][column] = text
+        return matrix
+
+    def rows(self, separator=NAME_SEPARATOR):
+        """แต่ละแถวเป็น list [day, date, เซลล์...] สำหรับตัวสร้างผลลัพธ์"""
+        for day, date, cells in zip(self.day_names, self.date_nums.tolist(), self.cell_matrix(separator)):
+            yield [day, date] + cells
+
+    def select_columns(self, indices):
+        """สร้างตารางใหม่ที่มีเฉพาะคอลัมน์เนื้อหาตามลำดับ indices (เรียงจากน้อยไปมาก)"""
+        indices = sorted(indices)
+        remap = np.full(self.n_columns, -1, dtype=np.int64)
+        remap[indices] = np.arange(len(indices))
+
+        rows, columns = np.divmod(self.cell_ids, max(self.n_columns, 1))
+        new_columns = remap[columns] if len(columns) else columns
+        keep = new_columns >= 0
+        counts = np.diff(self.cell_starts)
+
+        cell_ids = rows[keep] * len(indices) + new_columns[keep]
+        name_codes = self.name_codes[np.repeat(keep, counts)]
+        cell_starts = np.concatenate([[0], np.cumsum(counts[keep])])
+        grid = ScheduleGrid(self.day_names, self.date_nums, [self.headers[i] for i in indices],
+                            [], cell_ids, cell_starts, name_codes, self.attrs)
+        # ใช้ dictionary ชื่อเดิมร่วมกัน ไม่ต้อง intern ใหม่
+        grid.names = self.names
+        return grid
+
+    def to_dataframe(self):
+        """แปลงเป็น DataFrame แบบเดิม (MultiIndex 5 ระดับ, เซลล์เป็นชื่อคั่นด้วย ",<br>")"""
+        content = pd.DataFrame(self.cell_matrix(), dtype=object)
+        table_df = pd.concat([
+            pd.DataFrame({"day": pd.Series(self.day_names, dtype=object), "date_num": self.date_nums}),
+            content,
+        ], axis=1)
+        table_df.columns = pd.MultiIndex.from_tuples(self.columns)
+        table_df.attrs.update(self.attrs)
+        return table_df
+
+    def to_html(self, job=None, renderer=None):
+        """สร้างหน้า HTML ของตาราง (เหมือน html_generator.generate_html)"""
+        from html_generator import generate_html
+        return generate_html(self, job, renderer)
@@ -0,0 +1,187 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from config import SERVER_HOST, SERVER_PORT, SERVER_CACHE_SIZE, SERVER_CACHE_TTL, TableJob, default_job
+from data_loader import connect_to_mongodb, load_schedule_data
+from data_normalizer import normalize_schedule_data
+from table_processor import process_table_data
+from html_generator import generate_html
+from image_exporter import render_image_cached
+from snapshot_cache import month_is_closed
+
+class TableNotFound(Exception):
+    """ไม่พบข้อมูลของตารางที่ขอ"""
+
+class LRUCache:
+    """cache ในหน่วยความจำแบบ LRU
+
+    ตารางของเดือนที่ปิดแล้วเก็บได้จนถูกลบตามลำดับ LRU ส่วนเดือนปัจจุบันหมดอายุใน ttl วินาที
+    """
+
+    def __init__(self, max_size=SERVER_CACHE_SIZE, ttl=SERVER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (เวลาหมดอายุ, ค่า)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if time.monotonic() > expires:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, job):
+        expires = float("inf") if month_is_closed(job.month, job.year) else time.monotonic() + self.ttl
+        with self.lock:
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+class RequestCoalescer:
+    """รวมคำขอที่เหมือนกันและมาพร้อมกันให้ทำงานจริงครั้งเดียว แล้วแบ่งผลลัพธ์ให้ทุกคำขอ"""
+
+    def __init__(self):
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def run(self, key, func):
+        with self.lock:
+            future = self.in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self.in_flight[key] = Future()
+
+        if not owner:
+            return future.result()
+
+        try:
+            future.set_result(func())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+        return future.result()
+
+class TableService:
+    """สร้างตาราง HTML/PNG ตามคำขอ โดยใช้ MongoClient, cache และ coalescer ร่วมกันทุกคำขอ"""
+
+    def __init__(self, collection=None, cache_size=SERVER_CACHE_SIZE, cache_ttl=SERVER_CACHE_TTL):
+        self.collection = collection if collection is not None else connect_to_mongodb()
+        self.cache = LRUCache(cache_size, cache_ttl)
+        self.coalescer = RequestCoalescer()
+
+    def cached(self, key, job, build):
+        """คืนค่าจาก cache หรือสร้างใหม่ (คำขอเดียวกันที่มาพร้อมกันสร้างครั้งเดียว)"""
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+
+        def build_and_store():
+            value = self.cache.get(key)
+            if value is None:
+                value = build()
+                self.cache.put(key, value, job)
+            return value
+
+        return self.coalescer.run(key, build_and_store)
+
+    def table_html(self, job):
+        def build():
+            df = load_schedule_data(job, collection=self.collection)
+            if df is None:
+                raise TableNotFound(f"ไม่พบข้อมูลสำหรับ {job.department} ประเภท {job.table_type} {job.month}/{job.year}")
+            grid, column_keys = process_table_data(normalize_schedule_data(df), job)
+            return generate_html(grid, job)
+
+        return self.cached((job, "html"), job, build)
+
+    def table_png(self, job):
+        return self.cached((job, "png"), job, lambda: render_image_cached(self.table_html(job)))
+
+def parse_table_request(query):
+    """แปลง query string เป็น (TableJob, รูปแบบผลลัพธ์) (ValueError ถ้าค่าไม่ถูกต้อง)"""
+    params = {key: values[-1] for key, values in parse_qs(query).items()}
+    defaults = default_job()
+    job = TableJob(
+        params.get("department") or defaults.department,
+        params.get("type") or defaults.table_type,
+        int(params.get("month") or defaults.month),
+        int(params.get("year") or defaults.year),
+    )
+    if not 1 <= job.month <= 12:
+        raise ValueError(f"month ต้องอยู่ระหว่าง 1-12: {job.month}")
+
+    output_format = params.get("format", "html").lower()
+    if output_format not in ("html", "png"):
+        raise ValueError(f"format ต้องเป็น html หรือ png: {output_format}")
+    return job, output_format
+
+class TableRequestHandler(BaseHTTPRequestHandler):
+    """GET /table?department=&type=&month=&year=&format=html|png"""
+
+    service = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/table":
+            self.send_text(404, "not found")
+            return
+
+        try:
+            job, output_format = parse_table_request(url.query)
+            if output_format == "png":
+                body, content_type = self.service.table_png(job), "image/png"
+            else:
+                body, content_type = self.service.table_html(job).encode("utf-8"), "text/html; charset=utf-8"
+        except ValueError as e:
+            self.send_text(400, str(e))
+            return
+        except TableNotFound as e:
+            self.send_text(404, str(e))
+            return
+        except Exception as e:
+            self.send_text(500, f"เกิดข้อผิดพลาดในการสร้างตาราง: {e}")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_text(self, status, message):
+        body = message.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def create_server(host=SERVER_HOST, port=SERVER_PORT, service=None):
+    """สร้าง HTTP server (แต่ละคำขอทำงานใน thread ของตัวเอง)"""
+    handler = type("Handler", (TableRequestHandler,), {"service": service or TableService()})
+    return ThreadingHTTPServer((host, port), handler)
+
+def serve(host=SERVER_HOST, port=SERVER_PORT):
+    server = create_server(host, port)
+    print(f"เปิด service ที่ http://{host}:{port}/table")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    serve()
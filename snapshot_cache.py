@@ -0,0 +1,138 @@
+import io
+import os
+import threading
+import time
+from datetime import datetime
+from urllib.parse import quote, unquote
+import pandas as pd
+from config import SNAPSHOT_ENABLED, SNAPSHOT_DIR, SNAPSHOT_TTL, OFFLINE_MODE, TableJob
+from utils import write_file_atomic
+
+# คอลัมน์ที่ไม่เก็บใน snapshot (เป็นส่วนหนึ่งของ key อยู่แล้ว)
+SNAPSHOT_KEY_FIELDS = ["department", "type"]
+
+def next_month_start(month, year):
+    """วันแรกของเดือนถัดไป (เวลาที่เดือนนี้ปิด)"""
+    return datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+
+def month_is_closed(month, year, now=None):
+    """เดือนนี้ปิดแล้วหรือยัง (เลยวันแรกของเดือนถัดไปแล้ว)"""
+    now = now or datetime.now()
+    return now >= next_month_start(month, year)
+
+class SnapshotCache:
+    """snapshot ข้อมูลดิบของแต่ละตารางเป็นไฟล์ Parquet
+
+    เก็บที่ <directory>/<ปี>-<เดือน>/<แผนก>/<ประเภท>.parquet
+    snapshot ที่บันทึกหลังเดือนปิดแล้วถือว่าไม่เปลี่ยน ส่วน snapshot ที่บันทึกก่อนเดือนปิด
+    (รวมถึงเดือนปัจจุบัน) ใช้ได้ภายใน ttl วินาทีนับจากที่บันทึก แล้วจะถูกโหลดและบันทึกใหม่
+    """
+
+    def __init__(self, directory=SNAPSHOT_DIR, ttl=SNAPSHOT_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def path(self, job):
+        job = TableJob(*job)
+        return os.path.join(
+            self.directory,
+            f"{job.year}-{job.month:02d}",
+            quote(str(job.department), safe=""),
+            f"{quote(str(job.table_type), safe='')}.parquet",
+        )
+
+    def is_fresh(self, job, path=None):
+        """snapshot ยังใช้ได้หรือไม่ตามนโยบายความสดของข้อมูล"""
+        path = path or self.path(job)
+        if not os.path.exists(path):
+            return False
+        modified = os.path.getmtime(path)
+        # บันทึกหลังเดือนปิดแล้วจึงมีข้อมูลครบทั้งเดือน ถ้าบันทึกก่อนนั้นอาจยังมีการแก้ไขภายหลัง
+        if modified >= next_month_start(job.month, job.year).timestamp():
+            return True
+        return time.time() - modified <= self.ttl
+
+    def get(self, job, allow_stale=False):
+        """อ่าน snapshot ของงาน (None ถ้าไม่มีหรือหมดอายุ) allow_stale=True ใช้ได้แม้หมดอายุ"""
+        job = TableJob(*job)
+        path = self.path(job)
+        fresh = self.is_fresh(job, path)
+        if not fresh and not (allow_stale and os.path.exists(path)):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        if not fresh:
+            print(f"Warning: snapshot ของ {job.department} {job.table_type} {job.month}/{job.year} อาจไม่เป็นปัจจุบัน")
+        try:
+            # อ่านแบบ memory-map ไม่ต้องคัดลอกไฟล์ทั้งก้อนเข้าหน่วยความจำก่อน
+            df = pd.read_parquet(path, engine="pyarrow", memory_map=True)
+        except (OSError, ValueError) as e:
+            print(f"Warning: อ่าน snapshot {path} ไม่ได้: {e}")
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+        return df
+
+    def put(self, job, df):
+        """บันทึกข้อมูลดิบของงานเป็น snapshot (คืนค่า False ถ้าบันทึกไม่ได้)"""
+        df = df.drop(columns=[c for c in SNAPSHOT_KEY_FIELDS if c in df.columns])
+        buffer = io.BytesIO()
+        try:
+            df.to_parquet(buffer, engine="pyarrow", index=False)
+        except (TypeError, ValueError) as e:
+            # เช่น คอลัมน์ที่มีข้อมูลหลายชนิดปนกัน
+            print(f"Warning: บันทึก snapshot ของ {job.department} {job.table_type} ไม่ได้: {e}")
+            return False
+
+        path = self.path(job)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_file_atomic(path, buffer.getvalue())
+        return True
+
+    def invalidate(self, job):
+        """ลบ snapshot ของงาน (เช่น เมื่อพบว่าข้อมูลใน MongoDB เปลี่ยน)"""
+        try:
+            os.remove(self.path(job))
+        except FileNotFoundError:
+            pass
+
+    def jobs(self, month, year):
+        """รายการงานที่มี snapshot ของเดือน month ปี year"""
+        month_dir = os.path.join(self.directory, f"{year}-{month:02d}")
+        if not os.path.isdir(month_dir):
+            return []
+
+        jobs = []
+        for department in sorted(os.listdir(month_dir)):
+            department_dir = os.path.join(month_dir, department)
+            if not os.path.isdir(department_dir):
+                continue
+            for name in sorted(os.listdir(department_dir)):
+                if name.endswith(".parquet") and not name.startswith("."):
+                    jobs.append(TableJob(unquote(department), unquote(name[:-len(".parquet")]), month, year))
+        return jobs
+
+    def stats(self):
+        """คืนค่าสถิติการใช้งาน snapshot"""
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_snapshot_cache(offline=OFFLINE_MODE):
+    """คืนค่า snapshot cache ที่ใช้ร่วมกันทั้ง process (None ถ้าปิดใช้งานและไม่ใช่ offline mode)"""
+    global _default_cache
+    if not (SNAPSHOT_ENABLED or offline):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = SnapshotCache()
+    return _default_cache
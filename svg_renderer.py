@@ -0,0 +1,243 @@
+import os
+import unicodedata
+from functools import lru_cache
+from xml.sax.saxutils import escape
+from config import FONT_PATH, FONT_FAMILY, SVG_FORMATS, OUTPUT_DIR, month_names, title_mapping, default_job
+from html_generator import build_header_rows, split_table_columns
+from image_exporter import output_file_name
+from font_embed import font_face_css
+from utils import write_file_atomic
+
+# ขนาดและสีให้ใกล้เคียงกับ HTML (font 14px, padding 10px, line-height 1.5, เซลล์กว้างสุด 150px)
+FONT_SIZE = 14
+LINE_HEIGHT = 21
+CELL_PADDING = 10
+HEADER_PADDING_X = 4
+HEADER_PADDING_Y = 8
+MAX_CELL_TEXT_WIDTH = 150
+MIN_COLUMN_WIDTH = 40
+PAGE_PADDING = 20
+TITLE_SIZES = (24, 18.72, 18.72)  # h2, h3, h3
+BOLD_WIDTH_FACTOR = 1.06
+
+HEADER_COLOR = "#1B56FD"
+HEADER_BORDER_COLOR = "#0040CF"
+CELL_COLOR = "#AFDDFF"
+WEEKEND_COLOR = "#60B5FF"
+BACKGROUND_COLOR = "#f7f9fc"
+
+class FontMetrics:
+    """วัดความกว้างข้อความจาก hmtx ของฟอนต์ (ประมาณค่าเองถ้าไม่มีไฟล์ฟอนต์หรือ fontTools)"""
+
+    def __init__(self, path=FONT_PATH):
+        self.advances = None
+        try:
+            # import เมื่อวัดความกว้างจริงเท่านั้น (fontTools ใช้เวลา import นาน)
+            from fontTools.ttLib import TTFont
+        except ImportError:
+            TTFont = None
+        if TTFont is not None and path and os.path.exists(path):
+            font = TTFont(path, lazy=True)
+            units = font["head"].unitsPerEm
+            hmtx = font["hmtx"]
+            self.advances = {
+                chr(code): hmtx[glyph][0] / units
+                for code, glyph in font.getBestCmap().items()
+            }
+            font.close()
+        else:
+            print(f"Warning: ไม่พบฟอนต์ {path} (หรือไม่ได้ติดตั้ง fontTools) จะประมาณความกว้างข้อความแทน")
+
+    @staticmethod
+    def estimate(char):
+        """ความกว้างโดยประมาณ (หน่วย em) ของตัวอักษรหนึ่งตัว"""
+        if unicodedata.category(char) == "Mn":
+            # สระบน/ล่างและวรรณยุกต์ไทยไม่กินที่
+            return 0.0
+        if char == " ":
+            return 0.28
+        if "\u0e00" <= char <= "\u0e7f" or char.isdigit():
+            return 0.58
+        if char.isupper():
+            return 0.68
+        return 0.52
+
+    def char_width(self, char):
+        if self.advances is not None and char in self.advances:
+            return self.advances[char]
+        return self.estimate(char)
+
+    def width(self, text, size=FONT_SIZE, bold=False):
+        """ความกว้างของข้อความเป็น px"""
+        width = sum(self.char_width(char) for char in str(text)) * size
+        return width * BOLD_WIDTH_FACTOR if bold else width
+
+@lru_cache(maxsize=None)
+def get_font_metrics(path=FONT_PATH):
+    """FontMetrics ที่โหลดครั้งเดียวต่อไฟล์ฟอนต์"""
+    return FontMetrics(path)
+
+def wrap_text(text, metrics, max_width):
+    """ตัดข้อความเป็นหลายบรรทัดไม่ให้กว้างเกิน max_width (ตัดที่ช่องว่างก่อน ถ้าไม่ได้จึงตัดกลางคำ)"""
+    lines = []
+    for paragraph in str(text).split("<br>"):
+        line = ""
+        for word in paragraph.split(" "):
+            candidate = f"{line} {word}" if line else word
+            if metrics.width(candidate) <= max_width:
+                line = candidate
+                continue
+            if line:
+                lines.append(line)
+            # คำที่ยาวเกินหนึ่งบรรทัด ตัดทีละตัวอักษร (ไม่แยกสระ/วรรณยุกต์ออกจากพยัญชนะ)
+            line = ""
+            for char in word:
+                if line and metrics.width(line + char) > max_width and unicodedata.category(char) != "Mn":
+                    lines.append(line)
+                    line = ""
+                line += char
+        lines.append(line)
+    return lines
+
+def text_element(x, y, text, size=FONT_SIZE, color="black", bold=False):
+    weight = ' font-weight="bold"' if bold else ""
+    return (f'<text x="{x:.1f}" y="{y:.1f}" font-size="{size}" fill="{color}"{weight} '
+            f'text-anchor="middle">{escape(str(text))}</text>')
+
+def render_table_svg(grid, job=None, part=None, metrics=None):
+    """วาดตารางเป็น SVG โดยตรง (ไม่ผ่าน HTML/wkhtmltoimage)
+
+    หัวตาราง 5 ระดับรวมช่องแบบเดียวกับ HTML, แถววันหยุดใช้สีเดียวกัน และชื่อหลายคนในเซลล์แยกบรรทัด
+    """
+    job = job or default_job()
+    metrics = metrics or get_font_metrics()
+    columns = grid.columns
+    header_rows = build_header_rows(columns)
+
+    # ตัดบรรทัดของทุกเซลล์ แล้วหาความกว้างของแต่ละคอลัมน์จากบรรทัดที่ยาวที่สุด
+    values = list(grid.rows())
+    cell_lines = [[wrap_text(value, metrics, MAX_CELL_TEXT_WIDTH) for value in row] for row in values]
+    widths = [MIN_COLUMN_WIDTH] * len(columns)
+    for row in cell_lines:
+        for index, lines in enumerate(row):
+            text_width = max(metrics.width(line) for line in lines) + 2 * CELL_PADDING
+            widths[index] = max(widths[index], text_width)
+
+    # หัวตารางที่กว้างกว่าคอลัมน์ที่ครอบอยู่ ขยายทุกคอลัมน์ในช่วงนั้นเท่าๆ กัน
+    for header_row in header_rows:
+        start = 0
+        for label, colspan in header_row:
+            needed = metrics.width(label, bold=True) + 2 * HEADER_PADDING_X
+            current = sum(widths[start:start + colspan])
+            if needed > current:
+                extra = (needed - current) / colspan
+                for index in range(start, start + colspan):
+                    widths[index] += extra
+            start += colspan
+
+    header_height = LINE_HEIGHT + 2 * HEADER_PADDING_Y
+    row_heights = [max(len(lines) for lines in row) * LINE_HEIGHT + 2 * CELL_PADDING for row in cell_lines]
+    table_width = sum(widths)
+
+    title = title_mapping.get(job.table_type, f"{job.table_type}")
+    month_name = month_names.get(job.month, f"เดือน {job.month}")
+    part_label = f" (ส่วนที่ {part[0]}/{part[1]})" if part is not None else ""
+    titles = [f"ชื่อตาราง : {title}{part_label}", f"แผนก : {job.department}", f"ประจำเดือน : {month_name} {job.year}"]
+    title_width = max(metrics.width(text, size, bold=True) for text, size in zip(titles, TITLE_SIZES))
+
+    width = max(table_width, title_width) + 2 * PAGE_PADDING
+    title_height = sum(size * 1.5 for size in TITLE_SIZES)
+    height = PAGE_PADDING * 2 + title_height + header_height * len(header_rows) + sum(row_heights)
+    center_x = width / 2
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" '
+        f'viewBox="0 0 {width:.1f} {height:.1f}" font-family="{FONT_FAMILY}, sans-serif">',
+    ]
+    # ฝังฟอนต์เฉพาะตัวอักษรที่ใช้ เพื่อให้แสดงผลเหมือนกันทุกเครื่องโดยไม่ต้องติดตั้งฟอนต์
+    font_face = font_face_css(grid.characters().union(*titles))
+    if font_face:
+        parts.append(f"<defs><style>{font_face}</style></defs>")
+    parts.append(f'<rect width="100%" height="100%" fill="{BACKGROUND_COLOR}"/>')
+
+    y = PAGE_PADDING
+    for text, size in zip(titles, TITLE_SIZES):
+        y += size * 1.5
+        parts.append(text_element(center_x, y - size * 0.4, text, size=size, bold=True))
+
+    left = PAGE_PADDING + (width - 2 * PAGE_PADDING - table_width) / 2
+    offsets = [left]
+    for column_width in widths:
+        offsets.append(offsets[-1] + column_width)
+
+    # หัวตาราง
+    for header_row in header_rows:
+        start = 0
+        for label, colspan in header_row:
+            x0, x1 = offsets[start], offsets[start + colspan]
+            parts.append(f'<rect x="{x0:.1f}" y="{y:.1f}" width="{x1 - x0:.1f}" height="{header_height:.1f}" '
+                         f'fill="{HEADER_COLOR}" stroke="{HEADER_BORDER_COLOR}"/>')
+            if label != "":
+                parts.append(text_element((x0 + x1) / 2, y + HEADER_PADDING_Y + FONT_SIZE * 1.1, label,
+                                          color="white", bold=True))
+            start += colspan
+        y += header_height
+
+    # เนื้อหา
+    weekend = grid.weekend_rows()
+    for row_index, row in enumerate(cell_lines):
+        fill = WEEKEND_COLOR if weekend[row_index] else CELL_COLOR
+        row_height = row_heights[row_index]
+        parts.append(f'<rect x="{left:.1f}" y="{y:.1f}" width="{table_width:.1f}" height="{row_height:.1f}" fill="{fill}"/>')
+        for index, lines in enumerate(row):
+            x = (offsets[index] + offsets[index + 1]) / 2
+            # จัดข้อความให้อยู่กลางเซลล์ในแนวตั้ง
+            top = y + (row_height - len(lines) * LINE_HEIGHT) / 2
+            for line_index, line in enumerate(lines):
+                if line:
+                    parts.append(text_element(x, top + line_index * LINE_HEIGHT + FONT_SIZE * 1.1, line))
+        parts.append(f'<line x1="{left:.1f}" y1="{y + row_height:.1f}" x2="{left + table_width:.1f}" '
+                     f'y2="{y + row_height:.1f}" stroke="white"/>')
+        y += row_height
+
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+def convert_svg(svg_content, output_format):
+    """แปลง SVG เป็น PNG หรือ PDF ด้วย cairosvg (ต้องติดตั้ง cairosvg และ cairo)"""
+    try:
+        import cairosvg
+    except (ImportError, OSError) as e:
+        raise RuntimeError(f"ต้องติดตั้ง cairosvg เพื่อสร้างไฟล์ {output_format}: {e}") from e
+    if output_format == "pdf":
+        return cairosvg.svg2pdf(bytestring=svg_content.encode("utf-8"))
+    return cairosvg.svg2png(bytestring=svg_content.encode("utf-8"))
+
+def export_table_svg(grid, job=None, output_dir=None, formats=None):
+    """บันทึกตารางเป็น SVG (และ PNG/PDF ตาม formats) โดยไม่ใช้ wkhtmltoimage
+
+    แบ่งตารางที่กว้างเกินไปตาม TILE_MODE เหมือนการ render ด้วย HTML คืนค่า True/False
+    """
+    job = job or default_job()
+    output_dir = output_dir or OUTPUT_DIR
+    formats = formats or SVG_FORMATS
+    os.makedirs(output_dir, exist_ok=True)
+
+    try:
+        tiles = split_table_columns(grid)
+        for index, tile in enumerate(tiles, start=1):
+            part = (index, len(tiles)) if len(tiles) > 1 else None
+            svg_content = render_table_svg(tile, job, part)
+            for output_format in formats:
+                data = svg_content.encode("utf-8") if output_format == "svg" else convert_svg(svg_content, output_format)
+                path = os.path.join(output_dir, output_file_name(job, output_format, part and part[0]))
+                write_file_atomic(path, data)
+
+        month_name = month_names.get(job.month, f"เดือน {job.month}")
+        title = title_mapping.get(job.table_type, f"ตาราง {job.table_type} ")
+        print(f"สร้างตาราง {title} สำหรับเดือน {month_name} {job.year} เรียบร้อยแล้ว")
+        return True
+
+    except Exception as e:
+        print(f"เกิดข้อผิดพลาดในการสร้างไฟล์ SVG: {e}")
+        return False
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+import numpy as np
+from config import TableJob
+
+# คำนำหน้าชื่อ ward ให้มีหลายรูปแบบเหมือนข้อมูลจริง (ตัวเลขท้าย, ช่วงด้วยขีด, ตัวอักษรปน)
+WARD_PREFIXES = ["ICU", "Ward", "OPD", "CCU", "ER", "19 B-", "F", "SICU", "PICU", "25 C-"]
+ROLE_NAMES = ["Staff", "Fellow", "R3", "R2", "R1", "Intern", "Extern", "Nurse", "Resident", "Visiting"]
+PERIOD_W_NAMES = ["เช้า", "กลางวัน", "บ่าย", "เย็น", "ดึก", "On call"]
+PERIOD_H_NAMES = ["8-16", "16-24", "0-8", "8-12", "12-16", "7-19", "19-7"]
+
+# ขนาดข้อมูลตั้งแต่แผนกเล็กจนถึงทั้งโรงพยาบาล
+SIZES = {
+    "small": dict(rows=600, roles=3, periods_w=2, periods_h=2, wards=5, subwards=2, doctors=15),
+    "medium": dict(rows=5000, roles=6, periods_w=4, periods_h=3, wards=15, subwards=4, doctors=60),
+    "large": dict(rows=20000, roles=8, periods_w=5, periods_h=5, wards=40, subwards=6, doctors=200),
+    "hospital": dict(rows=100000, roles=10, periods_w=6, periods_h=7, wards=120, subwards=8, doctors=800),
+}
+
+def value_names(names, count):
+    """ชื่อค่าจำนวน count จากรายการตั้งต้น (เติมเลขท้ายเมื่อไม่พอ)"""
+    return [names[i % len(names)] + (f" {i // len(names) + 1}" if i >= len(names) else "") for i in range(count)]
+
+def ward_names(count):
+    """ชื่อ ward จำนวน count"""
+    return [f"{WARD_PREFIXES[i % len(WARD_PREFIXES)]}{i // len(WARD_PREFIXES) + 1}" for i in range(count)]
+
+def generate_documents(job=None, rows=600, roles=3, periods_w=2, periods_h=2, wards=5, subwards=2,
+                       doctors=15, remark_as_ward=0.0, seed=0):
+    """สร้างเอกสารตารางเวรสังเคราะห์ในรูปแบบเดียวกับ company.doc
+
+    subwards คือจำนวนค่า remark ที่ใช้เป็น subward ต่อ ward (0 = ไม่มี remark)
+    remark_as_ward คือสัดส่วนเอกสารที่ไม่มี ward และเก็บชื่อ ward ไว้ใน remark แทน
+    """
+    job = TableJob(*job) if job else TableJob("Synthetic", "ตารางประจำเดือน", 1, 2025)
+    rng = np.random.default_rng(seed)
+
+    start = datetime(job.year, job.month, 1)
+    end = datetime(job.year + 1, 1, 1) if job.month == 12 else datetime(job.year, job.month + 1, 1)
+    days = (end - start).days
+
+    role_values = value_names(ROLE_NAMES, roles)
+    period_w_values = value_names(PERIOD_W_NAMES, periods_w)
+    period_h_values = value_names(PERIOD_H_NAMES, periods_h)
+    ward_values = ward_names(wards)
+    subward_values = [f"Sub {i + 1}" for i in range(subwards)]
+    doctor_values = [f"นพ.แพทย์{i + 1}" for i in range(doctors)]
+
+    day_offsets = rng.integers(0, days, rows)
+    hours = rng.integers(0, 24, rows)
+    role_idx = rng.integers(0, roles, rows)
+    period_w_idx = rng.integers(0, periods_w, rows)
+    period_h_idx = rng.integers(0, periods_h, rows)
+    ward_idx = rng.integers(0, wards, rows)
+    doctor_idx = rng.integers(0, doctors, rows)
+    subward_idx = rng.integers(-1, subwards, rows) if subwards else np.full(rows, -1)
+    remark_ward = rng.random(rows) < remark_as_ward
+
+    documents = []
+    for i in range(rows):
+        doc = {
+            "department": job.department,
+            "type": job.table_type,
+            "datetime": start + timedelta(days=int(day_offsets[i]), hours=int(hours[i])),
+            "role": role_values[role_idx[i]],
+            "name": doctor_values[doctor_idx[i]],
+            "period_w": period_w_values[period_w_idx[i]],
+            "period_h": period_h_values[period_h_idx[i]],
+        }
+        if remark_ward[i]:
+            doc["ward"] = ""
+            doc["remark"] = ward_values[ward_idx[i]]
+        else:
+            doc["ward"] = ward_values[ward_idx[i]]
+            if subward_idx[i] >= 0:
+                doc["remark"] = subward_values[subward_idx[i]]
+        documents.append(doc)
+    return documents
+
+def generate_month(size="small", job=None, seed=0, **overrides):
+    """สร้างเอกสารหนึ่งเดือนตามขนาดที่กำหนดใน SIZES (แก้ค่าบางตัวได้ด้วย overrides)"""
+    return generate_documents(job, seed=seed, **{**SIZES[size], **overrides})
@@ -1,8 +1,22 @@
+import numpy as np
 import pandas as pd
 import re
-from utils import natural_sort_key, custom_sort_key
-from config import table_type
+from collections import namedtuple
+from functools import lru_cache
+from utils import natural_sort_key, column_sort_key, subward_sort_key
+from config import default_job
+from data_normalizer import normalize_schedule_data, ROW_COUNT_FIELD
+from schedule_grid import ScheduleGrid, ColumnHeader
 
+# regex สำหรับจัดรูปแบบ ward (compile ครั้งเดียว)
+WARD_COMMA_RANGE_PATTERN = re.compile(r'-\d+,')
+WARD_NUMBER_SUFFIX_PATTERN = re.compile(r'(\d+)(\s*[A-Za-z].*)')
+WARD_PAIR_PATTERN = re.compile(r'(\d+\s*[A-Za-z])(\d+\s*[A-Za-z])')
+
+# รูปแบบ key ที่หา column ไม่เจอ พร้อมจำนวนแถวและรายชื่อ (เก็บเป็นข้อมูลธรรมดาใน attrs["unmatched_rows"])
+UnmatchedRows = namedtuple("UnmatchedRows", ["role", "period_w", "period_h", "ward", "subward", "rows", "names"])
+
+@lru_cache(maxsize=None)
 def format_ward_display(ward):
     """ฟังก์ชันสำหรับจัดรูปแบบการแสดงผลของ ward"""
     # กรณีไม่มี ward
@@ -10,7 +24,7 @@ def format_ward_display(ward):
         return ""
         
     # กรณี ward มีรูปแบบเช่น "25 C-128 C" -> "25 C-1,28 C"
-    if "-" in ward and not re.search(r'-\d+,', ward):
+    if "-" in ward and not WARD_COMMA_RANGE_PATTERN.search(ward):
         parts = ward.split("-")
         if len(parts) == 2:
             left_part = parts[0].strip()
@@ -18,7 +32,7 @@ def format_ward_display(ward):
             
             # หาตำแหน่งที่จะแทรกเครื่องหมายจุลภาค
             # กรณี "128 C" -> "1,28 C"
-            match = re.search(r'(\d+)(\s*[A-Za-z].*)', right_part)
+            match = WARD_NUMBER_SUFFIX_PATTERN.search(right_part)
             if match:
                 numbers = match.group(1)
                 suffix = match.group(2)
@@ -27,7 +41,7 @@ def format_ward_display(ward):
                     return f"{left_part}-{formatted_right}"
     
     # กรณี ward มีรูปแบบเช่น "26 A27 C" -> "26 A,27 C"
-    match = re.search(r'(\d+\s*[A-Za-z])(\d+\s*[A-Za-z])', ward)
+    match = WARD_PAIR_PATTERN.search(ward)
     if match:
         first_part = match.group(1)
         second_part = match.group(2)
@@ -36,89 +50,98 @@ def format_ward_display(ward):
     # กรณีอื่นๆ ไม่ต้องเปลี่ยนแปลง
     return ward
 
-def process_table_data(df):
-    """ประมวลผลข้อมูลตารางและจัดรูปแบบ"""
-    # 1. ดึง role จากข้อมูล
-    roles = df["role"].dropna().unique().tolist() if "role" in df.columns else ["Staff"]
-    roles.sort(key=lambda x: [int(text) if text.isdigit() else text.lower() for text in re.split(r'(\d+)', str(x))])
+def build_ward_table(wards):
+    """สร้างตาราง ward ดั้งเดิม -> ward ที่แสดงผล ครั้งเดียวต่อการประมวลผล (จัดรูปแบบเฉพาะ ward ที่ไม่ซ้ำกัน)"""
+    return {ward: format_ward_display(ward) for ward in set(wards)}
 
-    # ตรวจสอบว่ามีฟิลด์ ward หรือควรใช้ remark แทน
-    use_remark_as_ward = False
-    if "ward" not in df.columns and "remark" in df.columns:
-        use_remark_as_ward = True
-        print(f"ไม่พบฟิลด์ 'ward' ในข้อมูล กำลังใช้ฟิลด์ 'remark' แทน")
-    elif "ward" not in df.columns and "remark" not in df.columns:
-        # ถ้าไม่มีทั้ง ward และ remark ให้สร้างคอลัมน์ ward เปล่า
-        df["ward"] = ""
-        print(f"ไม่พบทั้งฟิลด์ 'ward' และ 'remark' ในข้อมูล กำลังสร้างคอลัมน์ 'ward' เปล่า")
+def build_column_index(column_keys):
+    """สร้าง hash index ของคอลัมน์: (role, period_w, period_h, ward) -> {subward: column key}"""
+    column_index = {}
+    for column_key in column_keys:
+        ward_key, subward = column_key.rsplit("|", 1)
+        role, period_w, period_h, ward = ward_key.split("|", 3)
+        column_index.setdefault((role, period_w, period_h, ward), {})[subward] = column_key
+    return column_index
 
-    # เพิ่มคอลัมน์ subward หากยังไม่มี และเก็บ remark เป็น subward ในกรณี Neurology
-    if "subward" not in df.columns:
-        df["subward"] = ""
-    
-    # กรณี Neurology: ถ้ามี ward และ remark ให้ใช้ remark เป็น subward
-    if "ward" in df.columns and "remark" in df.columns and not use_remark_as_ward:
-        print("พบทั้งฟิลด์ 'ward' และ 'remark' กำลังใช้ 'remark' เป็น subward")
-        # คัดลอก remark ไปใส่ subward
-        for idx, row in df.iterrows():
-            if row.get("remark", ""):
-                df.at[idx, "subward"] = row["remark"]
+def match_column(column_index, role, period_w, period_h, ward, subward):
+    """หาคอลัมน์ของข้อมูลหนึ่งแถวจาก index (คืนค่า None ถ้าไม่พบ)"""
+    columns = column_index.get((role, period_w, period_h, ward))
+    if not columns:
+        return None
+
+    # ถ้าไม่มี subward ให้ใช้คอลัมน์ที่ไม่มี subward หรือคอลัมน์แรกของ ward เดียวกัน
+    if subward in ("", "None"):
+        return columns.get("", next(iter(columns.values())))
+    return columns.get(subward)
+
+def category_codes(values):
+    """รหัสของแต่ละแถวและข้อความของแต่ละรหัส (แบบเดียวกับ f-string: None -> "None", ค่าว่าง -> "nan")
+
+    ใช้รหัสของ categorical โดยตรง ค่าว่าง (รหัส -1) ใช้รหัสสุดท้ายที่มีข้อความ "nan"
+    """
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype(str).astype("category")
+    labels = np.array([str(value) for value in values.cat.categories] + ["nan"], dtype=object)
+    codes = values.cat.codes.to_numpy().astype(np.int64)
+    codes[codes < 0] = len(labels) - 1
+    return codes, labels
+
+def summarize_unmatched(rows):
+    """รวมแถวที่หา column ไม่เจอตามรูปแบบ key พร้อมจำนวนแถว (ผลรวมของคอลัมน์ rows) และรายชื่อ
+
+    คืนค่าเป็น list ของ UnmatchedRows (ไม่ใช่ DataFrame เพราะ pandas คัดลอก attrs ทุกครั้งที่สร้าง DataFrame ใหม่)
+    """
+    if rows.empty:
+        return []
+    summary = (
+        rows.groupby(["role", "period_w", "period_h", "ward", "subward"], sort=False)
+        .agg(rows=("rows", "sum"), names=("name", lambda names: list(dict.fromkeys(names))))
+        .reset_index()
+    )
+    return [
+        UnmatchedRows(*map(str, key), int(count), names)
+        for *key, count, names in summary.itertuples(index=False, name=None)
+    ]
+
+def process_table_data(df, job=None):
+    """ประมวลผลข้อมูลตารางและจัดรูปแบบ
+
+    คืนค่า (ScheduleGrid, column_keys) ใช้ ScheduleGrid.to_dataframe() ถ้าต้องการ DataFrame แบบเดิม
+    """
+    table_type = (job or default_job()).table_type
+
+    # จัดรูปแบบข้อมูลก่อน (ถ้ายังไม่ได้ผ่าน normalize_schedule_data)
+    if not df.attrs.get("normalized"):
+        df = normalize_schedule_data(df)
+
+    # 1. ดึง role จากข้อมูล
+    roles = df["role"].dropna().unique().tolist()
+    roles.sort(key=natural_sort_key)
 
     # 2. สร้างโครงสร้างข้อมูลแบบ hierarchy ใหม่ให้รองรับ period_w และ period_h
-    role_data_mapping = {}
-    
-    for role in roles:
-        # กรองข้อมูลตาม role
-        role_data = df[df["role"] == role] if "role" in df.columns else df
-        
-        # ตรวจสอบว่ามี period_w หรือไม่
-        if "period_w" in df.columns:
-            period_ws = role_data["period_w"].dropna().unique().tolist()
-        else:
-            period_ws = [""]  # ถ้าไม่มี ใช้ค่าว่าง
-        
-        # เก็บข้อมูลลงใน mapping
-        role_data_mapping[role] = {}
-        
-        for period_w in period_ws:
-            # กรองข้อมูลตาม period_w
-            period_w_data = role_data[role_data["period_w"] == period_w] if "period_w" in df.columns and period_w != "" else role_data
-            
-            # ตรวจสอบว่ามี period_h หรือไม่
-            if "period_h" in df.columns:
-                period_hs = period_w_data["period_h"].dropna().unique().tolist()
-            else:
-                period_hs = [""]  # ถ้าไม่มี ใช้ค่าว่าง
-            
-            role_data_mapping[role][period_w] = {}
-            
-            for period_h in period_hs:
-                # กรองข้อมูลตาม period_h
-                period_h_data = period_w_data[period_w_data["period_h"] == period_h] if "period_h" in df.columns and period_h != "" else period_w_data
-                
-                # ดึง ward ที่เกี่ยวข้อง
-                if use_remark_as_ward:
-                    wards = period_h_data["remark"].dropna().unique().tolist()
-                else:
-                    wards = period_h_data["ward"].dropna().unique().tolist()
-                
-                wards.sort(key=natural_sort_key)
-                
-                # เก็บข้อมูล ward และ subward
-                role_data_mapping[role][period_w][period_h] = {}
-                
-                for ward in wards:
-                    # กรองข้อมูลตาม ward
-                    if use_remark_as_ward:
-                        ward_data = period_h_data[period_h_data["remark"] == ward]
-                    else:
-                        ward_data = period_h_data[period_h_data["ward"] == ward]
-                    
-                    # ดึง subward ที่เกี่ยวข้อง
-                    subwards = ward_data["subward"].dropna().unique().tolist()
-                    
-                    # เก็บ subward
-                    role_data_mapping[role][period_w][period_h][ward] = subwards
+    # ใช้ drop_duplicates ครั้งเดียวแทนการกรอง DataFrame ซ้ำในแต่ละระดับ
+    # (ลำดับที่ได้ยังเป็นลำดับที่พบครั้งแรกในข้อมูลเหมือนเดิม)
+    hierarchy = df[["role", "period_w", "period_h", "ward", "subward"]]
+    hierarchy = hierarchy.dropna(subset=["role", "period_w", "period_h", "ward"]).drop_duplicates()
+    ward_table = build_ward_table(hierarchy["ward"])
+
+    role_data_mapping = {role: {} for role in roles}
+    for role, period_w, period_h, ward, subward in hierarchy.itertuples(index=False):
+        subwards = (
+            role_data_mapping[role]
+            .setdefault(period_w, {})
+            .setdefault(period_h, {})
+            .setdefault(ward, [])
+        )
+        # เก็บ subward
+        if pd.notna(subward):
+            subwards.append(subward)
+
+    # เรียง ward ในแต่ละ period_h
+    for period_w_data in role_data_mapping.values():
+        for period_h_data in period_w_data.values():
+            for period_h, wards_data in period_h_data.items():
+                period_h_data[period_h] = dict(sorted(wards_data.items(), key=lambda item: natural_sort_key(item[0])))
     
     # สร้าง header_tuples และ column_keys
     header_tuples = [
@@ -126,7 +149,8 @@ def process_table_data(df):
         ("", "", "", "Date", "")
     ]
     
-    column_keys = []
+    content_keys = []
+    original_wards = []  # ward ดั้งเดิมของแต่ละ header (ก่อนจัดรูปแบบ)
     
     # สร้าง header tuples ตามโครงสร้างใหม่
     for role in roles:
@@ -134,253 +158,112 @@ def process_table_data(df):
             for period_h, wards_data in period_h_data.items():
                 for ward, subwards in wards_data.items():
                     # จัดรูปแบบการแสดงผล ward ใหม่
-                    display_ward = format_ward_display(ward)
+                    display_ward = ward_table[ward]
                     
                     if subwards:
                         # เรียงลำดับ subward
-                        subward_order = {
-                            "Chief": 1,
-                            "SICU": 2, 
-                            "CVT ICU": 3,
-                            "Stroke": 1,
-                            "Non Stroke": 2,
-                        }
-                        
-                        subwards = sorted(subwards, key=lambda x: subward_order.get(x, 999))
+                        subwards = sorted(subwards, key=subward_sort_key)
                         
                         for subward in subwards:
                             header_tuples.append((role, period_w, period_h, display_ward, subward))
-                            column_keys.append(f"{role}|{period_w}|{period_h}|{ward}|{subward}")
+                            content_keys.append(f"{role}|{period_w}|{period_h}|{ward}|{subward}")
+                            original_wards.append(ward)
                     else:
                         # ไม่มี subward
                         header_tuples.append((role, period_w, period_h, display_ward, ""))
-                        column_keys.append(f"{role}|{period_w}|{period_h}|{ward}|")
+                        content_keys.append(f"{role}|{period_w}|{period_h}|{ward}|")
+                        original_wards.append(ward)
 
     # เรียงลำดับ header เพื่อให้แสดงเป็นระเบียบ (แยก Day, Date ออกก่อน)
     day_date_tuples = [header_tuples[0], header_tuples[1]]  # Day, Date
     content_tuples = header_tuples[2:]  # เนื้อหาอื่นๆ
     
-    # เรียงลำดับตามเงื่อนไขให้
-    def custom_sort_key_extended(item):
-        role, period_w, period_h, ward, subward = item
-        
-        # หา ward ดั้งเดิมจาก column_keys
-        original_ward = ""
-        for key in column_keys:
-            parts = key.split("|")
-            if parts[0] == role and parts[1] == period_w and parts[2] == period_h and format_ward_display(parts[3]) == ward:
-                original_ward = parts[3]
-                break
-        
-        if not original_ward:
-            original_ward = ward
-        
-        # เรียงลำดับ role ตาม special_order
-        special_order = {
-            "R1": 1, "R2": 2, "R3": 3, "Fellow": 4, "Staff": 5,
-            "Stroke": 1, "Non Stroke": 2,
-        }
-        role_priority = special_order.get(role, 999)
-        
-        # เรียงลำดับ period_w
-        period_w_order = {
-            "เช้า": 1, "กลางวัน": 2, "เย็น": 3, "ดึก": 4
-        }
-        period_w_priority = period_w_order.get(period_w, 999)
-        
-        # เรียงลำดับ period_h
-        period_h_start = 0
-        if period_h and "-" in period_h:
-            try:
-                period_h_start = int(period_h.split("-")[0])
-            except:
-                period_h_start = 0
-        
-        # เรียงลำดับ ward
-        ward_order = {
-            "CVT": 1,"CRITICAL CARE": 2,"PAIN": 3,"PED": 4,
-            "เวร Day": 1,"เวรทั้งวัน": 2,
-            "19 B-2": 1,"19 B-1": 2,"25 C-128 C": 3,"26 A27 C":4,"26 B27 C":5,
-            "วังบน": 1,"วังล่าง": 2,"ICU 1": 3,"ICU1": 3,"ICU 2":4,"ICU2":4,"CCU":5,"ER":6,"COVID":7,"COVID 2 (จก4)":8,"OPD 9 บ่าย":9,"OPD 9 เช้าวันหยุด":10,
-            #Cardiology
-            "F1": 1,"F2": 2,"F3 MRI / ECHO": 3,"F3 EP":4,"F3 HF":5,"F3 Cath":6,
-            #Nephrology
-            "1st call": 1,"Standby": 2,"F3":3,
-            "Stroke": 1,"Epliepsy": 12,
-            "Neuroimmuno": 13,"Neurocognitive": 14,"Neuromuscular":15,
-            #กุมาร R1
-            "ภส.20C, 19C1-C2 18C 21C, 28B":1,"สก.15G1 ,G2 สก. 6":2,"Nursery":7,"OPD No.9":8,
-            #กุมาร R2
-            "สก/ภส.":1,"OPD9":6,
-            #กุมาร R3
-            "สก/ภูมิสิริ":1,"PICU":3,"NICU":4,"CRC":5,
-        }
-        
-        ward_priority = 999
-        for key, value in ward_order.items():
-            if key in original_ward:
-                ward_priority = value
-                break
-        
-        # แยกส่วนที่เป็นตัวอักษรและตัวเลขใน ward
-        ward_text = ''.join(re.findall(r'[A-Za-z]+', original_ward))
-        ward_numbers = re.findall(r'\d+', original_ward)
-        ward_number = int(ward_numbers[0]) if ward_numbers else 0
-        
-        # ส่งคืนลำดับความสำคัญ
-        return (role_priority, period_w_priority, period_h_start, ward_priority, ward_text, ward_number, subward)
-    
-    # เรียงลำดับเนื้อหา
-    sorted_content_tuples = sorted(content_tuples, key=custom_sort_key_extended)
+    # เรียงลำดับตามตารางกฎใน config โดยใช้ ward ดั้งเดิมของแต่ละ header
+    order = sorted(
+        range(len(content_tuples)),
+        key=lambda i: column_sort_key(*content_tuples[i][:3], original_wards[i], content_tuples[i][4])
+    )
+    sorted_content_tuples = [content_tuples[i] for i in order]
     
     # รวม tuples กลับเข้าด้วยกัน
     header_tuples = day_date_tuples + sorted_content_tuples
     
-    # สร้าง column_keys ใหม่
-    column_keys = ["Day", "Date"]
+    # สร้าง column_keys ใหม่ตามลำดับที่เรียงแล้ว (ward ดั้งเดิมติดไปกับแต่ละ header จึงไม่ต้องค้นย้อนกลับ)
+    column_keys = ["Day", "Date"] + [content_keys[i] for i in order]
     
-    for i, (role, period_w, period_h, display_ward, subward) in enumerate(header_tuples[2:]):
-        # หา ward ดั้งเดิม
-        original_ward = ""
-        for role_key, period_w_data in role_data_mapping.items():
-            if role_key != role:
-                continue
-            for period_w_key, period_h_data in period_w_data.items():
-                if period_w_key != period_w:
-                    continue
-                for period_h_key, wards_data in period_h_data.items():
-                    if period_h_key != period_h:
-                        continue
-                    for ward_key in wards_data.keys():
-                        if format_ward_display(ward_key) == display_ward:
-                            original_ward = ward_key
-                            break
-        
-        if not original_ward:
-            original_ward = display_ward
-        
-        column_key = f"{role}|{period_w}|{period_h}|{original_ward}|{subward}"
-        column_keys.append(column_key)
-    
-    # รวมข้อมูลเข้า days_data
-    days_data = {}
-    
-    for _, row in df.iterrows():
-        date_key = row["date_key"]
-        day = row["day"]
-        date_num = row["date_num"]
-        role = row.get("role", roles[0])
-        name = row.get("name", "")
-        period_w = row.get("period_w", "")
-        period_h = row.get("period_h", "")
-        
-        # ดึงค่า ward ตามเงื่อนไข
-        if use_remark_as_ward:
-            ward = row.get("remark", "")
-        else:
-            # ตรวจสอบกรณีพิเศษสำหรับแผนก Gastroenterology
-            if table_type == "Gastoenterology" and not row.get("ward", ""):
-                ward = row.get("remark", "")
-            else:
-                ward = row.get("ward", "")
-        
-        # ดึงค่า subward (จากฟิลด์ subward ที่อาจได้ค่าจาก remark แล้ว)
-        subward = row.get("subward", "")
-        
-        if date_key not in days_data:
-            # สร้าง dictionary สำหรับวันนี้
-            day_entry = {
-                "Day": day,
-                "Date": date_num
-            }
-            # เพิ่มคอลัมน์ทั้งหมดเป็นค่าว่าง
-            for column_key in column_keys[2:]:  # ข้าม Day และ Date
-                day_entry[column_key] = ""
-            
-            days_data[date_key] = day_entry
-        
-        # สร้าง key สำหรับเข้าถึงข้อมูลใน days_data
-        column_key = f"{role}|{period_w}|{period_h}|{ward}|{subward}"
-        
-        # ถ้าไม่มี subward ให้ตรวจสอบว่ามี key แบบไม่มี subward หรือไม่
-        if not subward:
-            alt_key = f"{role}|{period_w}|{period_h}|{ward}|"
-            if alt_key in days_data[date_key]:
-                column_key = alt_key
-        
-        # ถ้าหา key ไม่เจอ ให้ลองค้นหาจาก column_keys
-        if column_key not in days_data[date_key]:
-            found = False
-            for existing_key in column_keys[2:]:  # ข้าม Day และ Date
-                parts = existing_key.split("|")
-                if (parts[0] == role and parts[1] == period_w and parts[2] == period_h and
-                    parts[3] == ward and (not subward or parts[4] == subward)):
-                    column_key = existing_key
-                    found = True
-                    break
-            
-            # ถ้ายังหาไม่เจอ ให้ข้ามข้อมูลนี้
-            if not found:
-                print(f"Warning: ไม่พบ column key ที่เหมาะสมสำหรับ {name} ({role}, {period_w}, {period_h}, {ward}, {subward})")
-                continue
-        
-        # เพิ่มชื่อลงในตาราง
-        current_value = days_data[date_key].get(column_key, "")
+    # รวมชื่อลงในตารางด้วย groupby/pivot บน (date_key, column key) แทนการวนทีละแถว
+    content_keys = column_keys[2:]  # ข้าม Day และ Date
 
-        if current_value:
-            # เก็บชื่อเป็น list
-            if isinstance(current_value, list):
-                # ตรวจสอบว่าชื่อซ้ำหรือไม่ก่อนเพิ่ม
-                if name not in current_value:
-                    days_data[date_key][column_key].append(name)
-            else:
-                # ถ้าชื่อแรกไม่ซ้ำกับชื่อที่จะเพิ่ม
-                if current_value != name:
-                    days_data[date_key][column_key] = [current_value, name]
-        else:
-            days_data[date_key][column_key] = name
-    
-    # แปลงเป็น DataFrame
-    table_data = []
-    for date_key, day_entry in sorted(days_data.items()):
-        row_data = {"Day": day_entry["Day"], "Date": day_entry["Date"]}
-        
-        # เพิ่มข้อมูลสำหรับแต่ละคอลัมน์
-        for column_key in column_keys[2:]:  # ข้าม Day และ Date
-            cell_value = day_entry.get(column_key, "")
-            
-            # แยกแต่ละส่วนของ column_key
-            parts = column_key.split("|")
-            if len(parts) >= 5:
-                role, period_w, period_h, ward, subward = parts
-                
-                # จัดรูปแบบการแสดงผล ward
-                display_ward = format_ward_display(ward)
-                
-                # สร้าง header tuple
-                header_tuple = (role, period_w, period_h, display_ward, subward)
-                
-                # ถ้ามีชื่อหลายคน ให้เตรียมข้อมูลสำหรับแสดงผลแบบขึ้นบรรทัดใหม่
-                if isinstance(cell_value, list):
-                    cell_value = "<br>".join([f"{name}," if i < len(cell_value)-1 else name 
-                                for i, name in enumerate(cell_value)])
-                
-                row_data[header_tuple] = cell_value
-        
-        table_data.append(row_data)
-    
-    # สร้าง DataFrame จากข้อมูล
-    table_df = pd.DataFrame(table_data)
-    
-    # สร้าง MultiIndex columns
-    multi_index_headers = [("", "", "", "Day", ""), ("", "", "", "Date", "")]
-    for column_key in column_keys[2:]:  # ข้าม Day และ Date
-        parts = column_key.split("|")
-        if len(parts) >= 5:
-            role, period_w, period_h, ward, subward = parts
-            display_ward = format_ward_display(ward)
-            multi_index_headers.append((role, period_w, period_h, display_ward, subward))
-    
-    table_df.columns = pd.MultiIndex.from_tuples(multi_index_headers)
-    
-    return table_df, column_keys
\ No newline at end of file
+    # ทำงานบนรหัส category ของแต่ละคอลัมน์ แปลงเป็นข้อความเฉพาะค่าที่ไม่ซ้ำกัน
+    role, role_labels = category_codes(df["role"])
+    period_w, period_w_labels = category_codes(df["period_w"])
+    period_h, period_h_labels = category_codes(df["period_h"])
+    ward, ward_labels = category_codes(df["ward"])
+
+    # ตรวจสอบกรณีพิเศษสำหรับแผนก Gastroenterology
+    if table_type == "Gastoenterology":
+        remark, remark_labels = category_codes(df["remark"])
+        use_remark = np.isin(ward_labels, ["", "None"])[ward]
+        ward = np.where(use_remark, remark + len(ward_labels), ward)
+        ward_labels = np.concatenate([ward_labels, remark_labels])
+
+    # ดึงค่า subward (จากฟิลด์ subward ที่อาจได้ค่าจาก remark แล้ว)
+    subward, subward_labels = category_codes(df["subward"])
+
+    names = df["name"]
+    # จำนวนเอกสารของแต่ละแถว (ข้อมูลจาก aggregation รวมเอกสารซ้ำไว้ในแถวเดียว)
+    row_counts = df[ROW_COUNT_FIELD].to_numpy() if ROW_COUNT_FIELD in df.columns else np.ones(len(df), dtype=np.int64)
+
+    # จับคู่แถวกับคอลัมน์ผ่าน hash index โดยแก้ key เฉพาะรูปแบบที่ไม่ซ้ำกันเท่านั้น
+    column_index = build_column_index(content_keys)
+    codes = [role, period_w, period_h, ward, subward]
+    labels = [role_labels, period_w_labels, period_h_labels, ward_labels, subward_labels]
+    combined = np.zeros(len(df), dtype=np.int64)
+    for field_codes, field_labels in zip(codes, labels):
+        combined = combined * len(field_labels) + field_codes
+    key_codes, _ = pd.factorize(combined)
+    _, first_rows = np.unique(key_codes, return_index=True)
+    unique_keys = zip(*(field_labels[field_codes[first_rows]] for field_codes, field_labels in zip(codes, labels)))
+    matched_columns = np.array([match_column(column_index, *key) for key in unique_keys], dtype=object)
+    column = pd.Series(matched_columns[key_codes], index=df.index)
+
+    # ถ้ายังหาไม่เจอ ให้ข้ามข้อมูลนี้ และรวมรายงานไว้ครั้งเดียว
+    missing = column.isna().to_numpy()
+    unmatched = summarize_unmatched(pd.DataFrame({
+        "role": role_labels[role[missing]],
+        "period_w": period_w_labels[period_w[missing]],
+        "period_h": period_h_labels[period_h[missing]],
+        "ward": ward_labels[ward[missing]],
+        "subward": subward_labels[subward[missing]],
+        "name": names[missing].to_numpy(),
+        "rows": row_counts[missing],
+    }))
+    if unmatched:
+        print(f"Warning: ไม่พบ column key ที่เหมาะสม {sum(row.rows for row in unmatched)} แถว ({len(unmatched)} รูปแบบ)")
+        for row in unmatched:
+            print(f"  ({row.role}, {row.period_w}, {row.period_h}, {row.ward}, {row.subward}): {row.rows} แถว - {', '.join(map(str, row.names))}")
+
+    cells = pd.DataFrame({"date_key": df["date_key"], "column": column, "name": names})
+    cells = cells.dropna()
+    cells = cells[cells["name"] != ""].drop_duplicates()
+
+    # ทุกวันที่พบในข้อมูลจะมีหนึ่งแถว เรียงตาม date_key
+    days = df.drop_duplicates("date_key").set_index("date_key")[["day", "date_num"]].sort_index()
+
+    # เก็บเซลล์เป็นรหัสแถว/คอลัมน์/ชื่อ (ชื่อหลายคนในเซลล์เรียงตามลำดับที่พบครั้งแรก)
+    column_positions = {key: position for position, key in enumerate(content_keys)}
+    headers = [
+        ColumnHeader(*header, key)
+        for header, key in zip(sorted_content_tuples, content_keys)
+    ]
+    grid = ScheduleGrid.from_cells(
+        days["day"].astype(object).tolist(),
+        days["date_num"].to_numpy(),
+        headers,
+        days.index.get_indexer(cells["date_key"]),
+        cells["column"].map(column_positions).to_numpy(dtype=np.int64),
+        cells["name"],
+        attrs={"unmatched_rows": unmatched},
+    )
+
+    return grid, column_keys
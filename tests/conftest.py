@@ -0,0 +1,5 @@
+import os
+import sys
+
+# โมดูลของโปรเจกต์อยู่ที่ root ของ repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
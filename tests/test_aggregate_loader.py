@@ -0,0 +1,95 @@
+import io
+import random
+from contextlib import redirect_stdout
+
+import pytest
+
+import data_loader
+from config import TableJob
+from synthetic_data import generate_month
+from table_processor import process_table_data
+
+mongomock = pytest.importorskip("mongomock")
+
+JOB = TableJob("วิสัญญี", "ตารางประจำเดือน", 12, 2024)
+GASTRO = TableJob("อายุรกรรม", "Gastoenterology", 12, 2024)
+
+def messy_documents(job, seed, **overrides):
+    """เอกสารสังเคราะห์ที่มีเอกสารซ้ำ เวลาซ้ำ ชื่อหาย ward เป็น None และเรียงแบบสุ่ม"""
+    rng = random.Random(seed)
+    docs = generate_month("small", job=job, seed=seed, **overrides)
+    for doc in docs:
+        if rng.random() < 0.03:
+            doc["ward"] = None
+        if rng.random() < 0.03:
+            doc.pop("name")
+    docs += [dict(doc) for doc in rng.sample(docs, 60)]
+    rng.shuffle(docs)
+    return docs
+
+def without_ward(docs):
+    for doc in docs:
+        ward = doc.pop("ward", None)
+        doc.setdefault("remark", ward or "")
+    return docs
+
+CASES = {
+    "ward_and_remark": lambda: messy_documents(JOB, 1),
+    "remark_as_ward": lambda: without_ward(messy_documents(JOB, 2, subwards=0)),
+    "many_names_per_cell": lambda: messy_documents(JOB, 3, rows=3000, doctors=8, wards=2),
+    "gastro": lambda: messy_documents(GASTRO, 4, remark_as_ward=0.4),
+}
+
+@pytest.fixture(autouse=True)
+def no_snapshots(monkeypatch):
+    monkeypatch.setattr(data_loader, "get_snapshot_cache", lambda offline=False: None)
+    monkeypatch.setattr(data_loader, "MONGO_ENSURE_INDEX", False)
+
+def build(job, df):
+    grid, column_keys = process_table_data(df, job)
+    return grid.to_dataframe(), column_keys, grid.attrs["unmatched_rows"]
+
+def load_tables(collection, jobs, aggregate, monkeypatch):
+    monkeypatch.setattr(data_loader, "MONGO_AGGREGATE", aggregate)
+    output = io.StringIO()
+    with redirect_stdout(output):
+        single = [build(job, data_loader.load_schedule_data(job, collection=collection, offline=False)) for job in jobs]
+        frames = data_loader.load_batch_data(jobs, collection=collection, offline=False)
+        batch = [build(job, frames[job]) for job in jobs]
+    return single, batch, output.getvalue()
+
+def assert_same_tables(expected, actual):
+    for (expected_df, expected_keys, expected_unmatched), (df, keys, unmatched) in zip(expected, actual):
+        assert list(df.columns) == list(expected_df.columns)
+        assert df.astype(str).values.tolist() == expected_df.astype(str).values.tolist()
+        assert keys == expected_keys
+        assert unmatched == expected_unmatched
+
+@pytest.mark.parametrize("case", sorted(CASES))
+def test_aggregate_matches_find(case, monkeypatch):
+    docs = CASES[case]()
+    job = TableJob(docs[0]["department"], docs[0]["type"], 12, 2024)
+    collection = mongomock.MongoClient()["company"]["doc"]
+    collection.insert_many(docs)
+
+    find_single, find_batch, find_output = load_tables(collection, [job], False, monkeypatch)
+    agg_single, agg_batch, agg_output = load_tables(collection, [job], True, monkeypatch)
+
+    assert_same_tables(find_single, agg_single)
+    assert_same_tables(find_batch, agg_batch)
+    assert_same_tables(find_single, find_batch)
+    assert agg_output == find_output
+
+def test_aggregate_matches_find_for_mixed_batch(monkeypatch):
+    other = TableJob("กุมารเวช", "ตารางประจำเดือน", 12, 2024)
+    collection = mongomock.MongoClient()["company"]["doc"]
+    collection.insert_many(messy_documents(JOB, 5) + without_ward(messy_documents(other, 6, subwards=0)))
+    jobs = [JOB, other]
+
+    find_single, find_batch, _ = load_tables(collection, jobs, False, monkeypatch)
+    agg_single, agg_batch, _ = load_tables(collection, jobs, True, monkeypatch)
+
+    assert_same_tables(find_single, agg_single)
+    assert_same_tables(find_batch, agg_batch)
+    assert_same_tables(find_single, find_batch)
+    assert any(unmatched for _, _, unmatched in find_single)
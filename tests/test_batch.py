@@ -0,0 +1,20 @@
+import batch
+from config import TableJob
+from instrumentation import PipelineMetrics
+
+GOOD = TableJob("วิสัญญี", "ตารางประจำเดือน", 12, 2024)
+BROKEN = TableJob("อายุรกรรม", "ตารางประจำเดือน", 12, 2024)
+
+def test_serial_batch_records_failed_table_and_continues(monkeypatch):
+    monkeypatch.setattr(batch, "IMAGE_BACKEND", "svg")
+    monkeypatch.setattr(batch, "load_batch_data", lambda *args, **kwargs: {BROKEN: "broken", GOOD: "good"})
+
+    def build(job, df, output_dir=None):
+        if df == "broken":
+            raise ValueError("ข้อมูลผิดรูปแบบ")
+        return True, PipelineMetrics(job, enabled=False)
+
+    monkeypatch.setattr(batch, "build_job_svg", build)
+    results = []
+    assert batch.run_batch(workers=1, on_result=lambda job, ok: results.append((job, ok))) == {BROKEN: False, GOOD: True}
+    assert results == [(BROKEN, False), (GOOD, True)]
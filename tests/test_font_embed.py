@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def build_font(path):
+    """สร้างฟอนต์ TrueType เล็กๆ ที่มี glyph ของ a, b, c และช่องว่าง"""
+    from fontTools.fontBuilder import FontBuilder
+    from fontTools.pens.ttGlyphPen import TTGlyphPen
+
+    glyph_names = [".notdef", "space", "a", "b", "c"]
+    pen = TTGlyphPen(None)
+    pen.moveTo((100, 0))
+    pen.lineTo((100, 500))
+    pen.lineTo((400, 500))
+    pen.closePath()
+    glyph = pen.glyph()
+    empty = TTGlyphPen(None).glyph()
+
+    builder = FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder(glyph_names)
+    builder.setupCharacterMap({ord(" "): "space", ord("a"): "a", ord("b"): "b", ord("c"): "c"})
+    builder.setupGlyf({name: (empty if name in (".notdef", "space") else glyph) for name in glyph_names})
+    builder.setupHorizontalMetrics({name: (500, 0) for name in glyph_names})
+    builder.setupHorizontalHeader(ascent=800, descent=-200)
+    builder.setupNameTable({"familyName": "Test", "styleName": "Regular"})
+    builder.setupOS2()
+    builder.setupPost()
+    builder.save(path)
+
+def font_face_in_new_process(path):
+    env = dict(os.environ, FONT_PATH=path, FONT_EMBED="1")
+    code = "from font_embed import font_face_css; print(font_face_css('abc'))"
+    return subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                          capture_output=True, text=True, check=True).stdout
+
+def test_font_face_is_identical_across_processes(tmp_path):
+    pytest.importorskip("fontTools")
+    path = str(tmp_path / "test.ttf")
+    build_font(path)
+
+    first = font_face_in_new_process(path)
+    # head.modified มีความละเอียดเป็นวินาที
+    time.sleep(1.1)
+    second = font_face_in_new_process(path)
+
+    assert "@font-face" in first
+    assert first == second
@@ -0,0 +1,30 @@
+import threading
+import tracemalloc
+
+from config import TableJob
+from instrumentation import PipelineMetrics
+
+JOB = TableJob("วิสัญญี", "ตารางประจำเดือน", 12, 2024)
+
+def test_concurrent_stages_keep_tracing_until_profile_ends():
+    metrics = PipelineMetrics(JOB, enabled=True, profile=["tracemalloc"])
+    barrier = threading.Barrier(4)
+
+    def export(part):
+        with metrics.stage(f"export_part{part}"):
+            data = [bytearray(100_000)]
+            # ให้ทุก thread อยู่ใน stage พร้อมกันก่อนออก
+            barrier.wait()
+            del data
+
+    with metrics.profile():
+        with metrics.profile():
+            threads = [threading.Thread(target=export, args=(part,)) for part in range(1, 5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        assert tracemalloc.is_tracing()
+
+    assert not tracemalloc.is_tracing()
+    assert all(metrics.stages[f"export_part{part}"]["peak_mb"] > 0 for part in range(1, 5))
@@ -0,0 +1,35 @@
+import os
+import time
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from config import TableJob
+from snapshot_cache import SnapshotCache
+
+pytest.importorskip("pyarrow")
+
+JOB = TableJob("วิสัญญี", "ตารางประจำเดือน", 12, 2024)
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SnapshotCache(directory=str(tmp_path), ttl=600)
+    cache.put(JOB, pd.DataFrame({"name": ["a"]}))
+    return cache
+
+def set_mtime(path, when):
+    os.utime(path, (when.timestamp(), when.timestamp()))
+
+def test_snapshot_written_after_month_closed_never_expires(cache):
+    set_mtime(cache.path(JOB), datetime(2025, 1, 1))
+    assert cache.is_fresh(JOB)
+
+def test_snapshot_written_before_month_closed_uses_ttl(cache):
+    set_mtime(cache.path(JOB), datetime(2024, 12, 15))
+    assert not cache.is_fresh(JOB)
+
+    # บันทึกใหม่หลังเดือนปิดแล้วจะใช้ได้ต่อไป
+    cache.put(JOB, pd.DataFrame({"name": ["a", "b"]}))
+    assert cache.is_fresh(JOB)
+    assert time.time() - os.path.getmtime(cache.path(JOB)) < 60
@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import pytest
+
+import watcher
+from config import TableJob
+
+JOB_A = TableJob("วิสัญญี", "ตารางประจำเดือน", 12, 2024)
+JOB_B = TableJob("อายุรกรรม", "ตารางประจำเดือน", 11, 2024)
+
+def doc(job, day=1, **fields):
+    return {"department": job.department, "type": job.table_type,
+            "datetime": datetime(job.year, job.month, day, 8), **fields}
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def timed_changes(clock, steps):
+    """แหล่งการเปลี่ยนแปลงจำลอง: steps เป็น list ของ (เวลา, เอกสาร)"""
+    for now, docs in steps:
+        clock.now = now
+        yield docs
+
+@pytest.fixture(autouse=True)
+def no_snapshots(monkeypatch):
+    monkeypatch.setattr(watcher, "get_snapshot_cache", lambda: None)
+
+def run_watch(steps, **options):
+    clock = FakeClock()
+    calls = []
+    watcher.watch(collection=object(), on_tables=lambda jobs: calls.append((clock.now, sorted(jobs))),
+                  changes=timed_changes(clock, steps), clock=clock, **options)
+    return calls
+
+def test_burst_of_edits_regenerates_each_table_once_after_quiet_period():
+    calls = run_watch([
+        (0, [doc(JOB_A, 1), doc(JOB_B, 3)]),
+        (2, [doc(JOB_A, 2)]),
+        (4, []),
+        (7, []),
+        (8, []),
+    ], debounce=5, max_delay=60)
+    assert calls == [(7, sorted([JOB_A, JOB_B]))]
+
+def test_continuous_edits_are_flushed_after_max_delay():
+    steps = [(t, [doc(JOB_A, t + 1)]) for t in range(0, 12, 2)]
+    calls = run_watch(steps, debounce=5, max_delay=10)
+    assert calls == [(10, [JOB_A])]
+
+def test_unmapped_documents_are_reported(capsys):
+    calls = run_watch([(0, [{"_id": 7, "department": "วิสัญญี"}]), (10, [])], debounce=5, max_delay=60)
+    assert calls == []
+    assert "Warning" in capsys.readouterr().out
+
+def test_stop_ends_the_loop():
+    steps = [(t, [doc(JOB_A)]) for t in range(100)]
+    calls = run_watch(steps, debounce=0, max_delay=0, stop=lambda: True)
+    assert calls == [(0, [JOB_A])]
+
+def test_polling_fallback_reports_new_documents(capsys):
+    mongomock = pytest.importorskip("mongomock")
+    collection = mongomock.MongoClient()["company"]["doc"]
+    collection.insert_one(doc(JOB_A))
+    changes = watcher.polling_changes(collection, interval=0)
+    assert next(changes) == []
+    assert "_id" in capsys.readouterr().out
+
+    collection.insert_one(doc(JOB_B))
+    assert [watcher.job_for_document(d) for d in next(changes)] == [JOB_B]
+
+class FakeStream:
+    def __init__(self, events):
+        self.events = list(events)
+
+    def try_next(self):
+        return self.events.pop(0) if self.events else None
+
+def test_change_stream_delete_without_pre_image_is_reported(capsys):
+    stream = FakeStream([
+        {"operationType": "update", "fullDocument": doc(JOB_A)},
+        {"operationType": "delete", "documentKey": {"_id": 42}},
+        {"operationType": "delete", "documentKey": {"_id": 43}, "fullDocumentBeforeChange": doc(JOB_B)},
+    ])
+    docs = next(watcher.change_stream_changes(stream, max_await=0.05))
+    assert [watcher.job_for_document(d) for d in docs] == [JOB_A, JOB_B]
+    out = capsys.readouterr().out
+    assert "delete _id=42" in out and "_id=43" not in out
@@ -1,32 +1,98 @@
+import os
 import re
+import tempfile
+from functools import lru_cache
+from config import COLUMN_ORDER_RULES
+
+# regex ที่ใช้ซ้ำบ่อย (compile ครั้งเดียว)
+DIGIT_SPLIT_PATTERN = re.compile(r'(\d+)')
+LETTERS_PATTERN = re.compile(r'[A-Za-z]+')
+DIGITS_PATTERN = re.compile(r'\d+')
+
+# ค่าลำดับสำหรับค่าที่ไม่อยู่ในตารางกฎ
+DEFAULT_PRIORITY = 999
 
 def natural_sort_key(s):
     """ฟังก์ชันสำหรับเรียงลำดับตามธรรมชาติ (เช่น 1, 2, 10 แทนที่จะเป็น 1, 10, 2)"""
-    return [int(text) if text.isdigit() else text.lower() for text in re.split(r'(\d+)', str(s))]
+    return [int(text) if text.isdigit() else text.lower() for text in DIGIT_SPLIT_PATTERN.split(str(s))]
+
+def compile_order_rules(rules):
+    """แปลงตารางกฎการเรียงลำดับเป็น lookup ที่ใช้ได้ทันที
+
+    role/period_w/subward เป็น dict จับคู่ค่าตรงตัว ส่วน ward เป็น list ของ
+    (key, ลำดับ) ที่ตรวจแบบ substring ตามลำดับในตาราง
+    """
+    global ROLE_ORDER, PERIOD_W_ORDER, SUBWARD_ORDER, WARD_ORDER
+    ROLE_ORDER = dict(rules.get("role", {}))
+    PERIOD_W_ORDER = dict(rules.get("period_w", {}))
+    SUBWARD_ORDER = dict(rules.get("subward", {}))
+    WARD_ORDER = tuple(rules.get("ward", {}).items())
+
+    # ล้างค่าที่ cache ไว้จากกฎชุดเดิม
+    ward_sort_key.cache_clear()
+    period_h_start.cache_clear()
+
+@lru_cache(maxsize=None)
+def ward_sort_key(ward):
+    """คืนค่า (ลำดับตามตารางกฎ, ตัวอักษร, ตัวเลขแรก) ของ ward (จำค่าไว้ต่อ ward)"""
+    ward = str(ward)
+    ward_priority = DEFAULT_PRIORITY
+    for key, value in WARD_ORDER:
+        if key in ward:
+            ward_priority = value
+            break
+
+    # แยกส่วนที่เป็นตัวอักษรและตัวเลขใน ward
+    ward_text = ''.join(LETTERS_PATTERN.findall(ward))
+    ward_numbers = DIGITS_PATTERN.findall(ward)
+    ward_number = int(ward_numbers[0]) if ward_numbers else 0
+
+    return (ward_priority, ward_text, ward_number)
+
+@lru_cache(maxsize=None)
+def period_h_start(period_h):
+    """ดึงชั่วโมงเริ่มต้นจาก period_h เช่น "8-16" -> 8"""
+    if period_h and "-" in str(period_h):
+        try:
+            return int(str(period_h).split("-")[0])
+        except ValueError:
+            return 0
+    return 0
+
+def subward_sort_key(subward):
+    """คีย์สำหรับเรียงลำดับ subward"""
+    return SUBWARD_ORDER.get(subward, DEFAULT_PRIORITY)
+
+def column_sort_key(role, period_w, period_h, ward, subward):
+    """คีย์สำหรับเรียงลำดับคอลัมน์เนื้อหา (ward เป็นค่าดั้งเดิมก่อนจัดรูปแบบ)"""
+    return (
+        ROLE_ORDER.get(role, DEFAULT_PRIORITY),
+        PERIOD_W_ORDER.get(period_w, DEFAULT_PRIORITY),
+        period_h_start(period_h),
+        *ward_sort_key(ward),
+        subward
+    )
 
 def custom_sort_key(item):
     """ฟังก์ชันสำหรับเรียงลำดับหัวข้อตาราง"""
     role, ward, _ = item
-    
-    # เรียงลำดับพิเศษสำหรับ R1, R2, R3, Fellow
-    special_order = {
-        "R1": 1,
-        "R2": 2, 
-        "R3": 3,
-        "Fellow": 4,
-        "Staff": 5
-    }
-    
-    # ถ้า role อยู่ใน special_order ให้เรียงตาม special_order
-    if role in special_order:
-        role_priority = special_order[role]
-    else:
-        # มิฉะนั้นให้เรียงตาม role ปกติ (ตัวอักษร)
-        role_priority = 999  # ค่าสูงเพื่อให้มาทีหลัง special_order
-    
-    # แยกส่วนที่เป็นตัวอักษรและตัวเลขใน ward
-    ward_text = ''.join(re.findall(r'[A-Za-z]+', ward))
-    ward_numbers = re.findall(r'\d+', ward)
-    ward_number = int(ward_numbers[0]) if ward_numbers else 0
-    
-    return (role_priority, ward_text, ward_number)
\ No newline at end of file
+    _, ward_text, ward_number = ward_sort_key(ward)
+    return (ROLE_ORDER.get(role, DEFAULT_PRIORITY), ward_text, ward_number)
+
+def write_file_atomic(path, data):
+    """เขียนไฟล์แบบ atomic: เขียนลงไฟล์ชั่วคราวในโฟลเดอร์เดียวกันแล้วแทนที่ด้วย os.replace"""
+    directory = os.path.dirname(path) or "."
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        # mkstemp สร้างไฟล์แบบ 0600 ปรับให้เหมือนไฟล์ทั่วไป
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return path
+
+compile_order_rules(COLUMN_ORDER_RULES)
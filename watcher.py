@@ -0,0 +1,148 @@
+import time
+from pymongo.errors import OperationFailure
+from config import WATCH_DEBOUNCE, WATCH_MAX_DELAY, WATCH_POLL_INTERVAL, WATCH_POLL_FIELD, TableJob
+from data_loader import connect_to_mongodb
+from snapshot_cache import get_snapshot_cache
+
+def job_for_document(doc):
+    """หางาน (แผนก, ประเภท, เดือน, ปี) ของเอกสารหนึ่งรายการ (None ถ้าข้อมูลไม่ครบ)"""
+    if not doc:
+        return None
+    department = doc.get("department")
+    table_type = doc.get("type")
+    doc_datetime = doc.get("datetime")
+    if not department or not table_type or not hasattr(doc_datetime, "month"):
+        return None
+    return TableJob(department, table_type, doc_datetime.month, doc_datetime.year)
+
+class Debouncer:
+    """รวมงานที่เปลี่ยนติดกันเป็นชุดเดียว
+
+    งานจะพร้อมเมื่อไม่มีการเปลี่ยนแปลงเพิ่มนาน quiet วินาที
+    หรือเมื่อรอมานานเกิน max_delay วินาทีนับจากการเปลี่ยนแปลงแรก
+    """
+
+    def __init__(self, quiet=WATCH_DEBOUNCE, max_delay=WATCH_MAX_DELAY, clock=time.monotonic):
+        self.quiet = quiet
+        self.max_delay = max_delay
+        self.clock = clock
+        self.pending = {}  # job -> (เวลาที่เปลี่ยนครั้งแรก, เวลาที่เปลี่ยนล่าสุด)
+
+    def add(self, job):
+        now = self.clock()
+        first, _ = self.pending.get(job, (now, now))
+        self.pending[job] = (first, now)
+
+    def pop_ready(self):
+        """คืนค่างานที่พร้อมสร้างใหม่และนำออกจากรายการรอ"""
+        now = self.clock()
+        ready = [
+            job for job, (first, last) in self.pending.items()
+            if now - last >= self.quiet or now - first >= self.max_delay
+        ]
+        for job in ready:
+            del self.pending[job]
+        return ready
+
+def open_change_stream(collection):
+    """เปิด change stream (คืนค่า None ถ้า server ไม่รองรับ เช่น standalone หรือ mongomock)"""
+    if not hasattr(type(collection), "watch"):
+        return None
+    # ขอเอกสารก่อนเปลี่ยนด้วยถ้าทำได้ (MongoDB 6.0+) เพื่อรู้ตารางเดิมของเอกสารที่ถูกย้ายหรือลบ
+    for options in ({"full_document": "updateLookup", "full_document_before_change": "whenAvailable"},
+                    {"full_document": "updateLookup"}):
+        try:
+            return collection.watch(**options)
+        except OperationFailure:
+            continue
+    return None
+
+def change_stream_changes(stream, max_await=1.0):
+    """อ่านเอกสารที่เปลี่ยนจาก change stream คืนค่าเป็น list ต่อรอบ (อาจว่างเมื่อไม่มีการเปลี่ยนแปลง)"""
+    while True:
+        docs = []
+        deadline = time.monotonic() + max_await
+        while time.monotonic() < deadline:
+            event = stream.try_next()
+            if event is None:
+                time.sleep(min(0.1, max(0.0, deadline - time.monotonic())))
+                continue
+            event_docs = [event.get("fullDocument"), event.get("fullDocumentBeforeChange")]
+            if not any(event_docs):
+                # เช่นการลบเมื่อ collection ไม่ได้เปิด changeStreamPreAndPostImages (ไม่มีเอกสารเดิมให้หาตาราง)
+                print(f"Warning: ไม่ทราบตารางของการเปลี่ยนแปลง {event.get('operationType')} "
+                      f"_id={event.get('documentKey', {}).get('_id')} จะไม่สร้างตารางใหม่ "
+                      f"(เปิด changeStreamPreAndPostImages ของ collection เพื่อให้ตรวจการลบได้)")
+            docs.extend(event_docs)
+        yield [doc for doc in docs if doc]
+
+def polling_changes(collection, interval=WATCH_POLL_INTERVAL, field=WATCH_POLL_FIELD):
+    """อ่านเอกสารที่เปลี่ยนด้วยการ poll ตาม watermark
+
+    ใช้ฟิลด์ field (เช่น updated) ถ้ามีในข้อมูล ไม่เช่นนั้นใช้ _id (ตรวจได้เฉพาะเอกสารที่เพิ่มใหม่)
+    """
+    if collection.find_one({field: {"$exists": True}}, {field: 1}) is None:
+        field = "_id"
+    print(f"ใช้ change stream ไม่ได้ กำลัง poll ทุก {interval} วินาที ด้วยฟิลด์ '{field}'")
+    if field == "_id":
+        print("Warning: poll ด้วย _id ตรวจได้เฉพาะเอกสารที่เพิ่มใหม่ การแก้ไขและการลบเอกสารจะไม่ถูกตรวจพบ")
+
+    latest = collection.find_one({field: {"$exists": True}}, {field: 1}, sort=[(field, -1)])
+    watermark = latest[field] if latest else None
+    projection = {"department": 1, "type": 1, "datetime": 1, field: 1}
+
+    while True:
+        query = {field: {"$gt": watermark}} if watermark is not None else {field: {"$exists": True}}
+        docs = list(collection.find(query, projection).sort(field, 1))
+        if docs:
+            watermark = docs[-1][field]
+        yield docs
+        time.sleep(interval)
+
+def watch(collection=None, on_tables=None, debounce=WATCH_DEBOUNCE, max_delay=WATCH_MAX_DELAY,
+          poll_interval=WATCH_POLL_INTERVAL, changes=None, stop=None, clock=time.monotonic):
+    """โหมดเฝ้าดู: สร้างใหม่เฉพาะตารางที่ข้อมูลใน company.doc เปลี่ยน
+
+    on_tables รับ list ของ TableJob ที่ต้องสร้างใหม่ (ค่าตั้งต้นคือ batch.run_batch)
+    changes ใช้แทนแหล่งการเปลี่ยนแปลงได้ (iterable ของ list เอกสาร) และ clock ใช้แทนนาฬิกาของ debounce สำหรับทดสอบ
+    stop เป็นฟังก์ชันที่คืนค่า True เมื่อต้องการหยุด
+    """
+    if collection is None:
+        collection = connect_to_mongodb()
+    if on_tables is None:
+        from batch import run_batch
+        on_tables = lambda jobs: run_batch(jobs=jobs, collection=collection)
+
+    if changes is None:
+        stream = open_change_stream(collection)
+        if stream is not None:
+            print("กำลังเฝ้าดูการเปลี่ยนแปลงด้วย change stream")
+            changes = change_stream_changes(stream)
+        else:
+            changes = polling_changes(collection, interval=poll_interval)
+
+    debouncer = Debouncer(quiet=debounce, max_delay=max_delay, clock=clock)
+    for docs in changes:
+        for doc in docs:
+            job = job_for_document(doc)
+            if job is not None:
+                debouncer.add(job)
+            else:
+                print(f"Warning: ไม่ทราบตารางของเอกสารที่เปลี่ยน _id={(doc or {}).get('_id')} "
+                      f"(ไม่มี department, type หรือ datetime) จะไม่สร้างตารางใหม่")
+
+        jobs = debouncer.pop_ready()
+        if jobs:
+            print(f"พบการเปลี่ยนแปลง {len(jobs)} ตาราง กำลังสร้างใหม่")
+            # snapshot ของตารางที่เปลี่ยนใช้ไม่ได้แล้ว (รวมถึงเดือนที่ปิดไปแล้ว)
+            snapshots = get_snapshot_cache()
+            if snapshots is not None:
+                for job in jobs:
+                    snapshots.invalidate(job)
+            on_tables(jobs)
+
+        if stop is not None and stop():
+            break
+
+if __name__ == "__main__":
+    watch()